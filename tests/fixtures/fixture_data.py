@@ -45,3 +45,9 @@ def few_posts_with_group(mixer, user, group):
 def another_few_posts_with_group_with_follower(mixer, user, another_user, group):
     mixer.blend('posts.Follow', user=user, author=another_user)
     mixer.cycle(20).blend(Post, author=another_user, group=group)
+
+
+@pytest.fixture(autouse=True)
+def eager_tasks(settings):
+    """Фоновые задачи выполняются в потоке теста, без воркера."""
+    settings.TASKS_EAGER = True
@@ -0,0 +1,49 @@
+import pytest
+from django.core.cache import cache
+from django.urls import resolve
+
+from core.decorators import QueryBudgetExceeded
+from posts.models import Post
+
+pytestmark = [pytest.mark.django_db]
+
+
+class TestQueryBudget:
+
+    @pytest.fixture(autouse=True)
+    def strict_budget(self, settings):
+        settings.QUERY_BUDGET_STRICT = True
+        cache.clear()
+
+    @pytest.fixture
+    def feed(self, mixer, user, another_user, group):
+        """Ленты без картинок: проверяем запросы к постам, а не к sorl."""
+        mixer.blend('posts.Follow', user=user, author=another_user)
+        mixer.cycle(15).blend(Post, author=user, group=group, image='')
+        mixer.cycle(15).blend(Post, author=another_user, group=group, image='')
+        return Post.objects.filter(author=user).first()
+
+    def check_budget(self, client, url):
+        view = resolve(url).func
+        assert hasattr(view, 'query_budget'), (
+            f'Объявите бюджет запросов для страницы `{url}` через `@query_budget`'
+        )
+        cache.clear()
+        try:
+            response = client.get(url)
+        except QueryBudgetExceeded as e:
+            assert False, f'Страница `{url}` превышает бюджет запросов: {e}'
+        assert response.status_code == 200
+
+    def test_feeds_budget(self, user_client, feed):
+        self.check_budget(user_client, '/')
+        self.check_budget(user_client, f'/group/{feed.group.slug}/')
+        self.check_budget(user_client, f'/profile/{feed.author.username}/')
+        self.check_budget(user_client, f'/posts/{feed.id}/')
+        self.check_budget(user_client, '/follow/')
+
+    def test_budget_not_depends_on_posts_count(self, user_client, mixer, user, group):
+        mixer.blend(Post, author=user, group=group, image='')
+        self.check_budget(user_client, f'/group/{group.slug}/')
+        mixer.cycle(9).blend(Post, author=user, group=group, image='')
+        self.check_budget(user_client, f'/group/{group.slug}/')
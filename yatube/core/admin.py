@@ -0,0 +1,90 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import SlowQuery, Task, TaskStat
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    """Самые дорогие запросы сверху; записи только читаются и удаляются."""
+    list_display = (
+        'sql',
+        'calls',
+        'total_ms',
+        'average_ms',
+        'max_ms',
+        'view',
+        'call_site',
+        'last_seen',
+    )
+    list_filter = ('view', 'last_seen')
+    search_fields = ('sql', 'view', 'call_site')
+    readonly_fields = (
+        'fingerprint', 'sql', 'plan', 'view', 'call_site', 'calls',
+        'total_ms', 'max_ms', 'first_seen', 'last_seen',
+    )
+    ordering = ('-total_ms',)
+    empty_value_display = '-пусто-'
+
+    def average_ms(self, obj):
+        return round(obj.total_ms / obj.calls, 1) if obj.calls else 0
+
+    average_ms.short_description = 'Среднее время, мс'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(SlowQuery, SlowQueryAdmin)
+
+
+class TaskAdmin(admin.ModelAdmin):
+    """Очередь и упавшие задачи; упавшие можно запустить заново."""
+    list_display = (
+        'name', 'status', 'attempts', 'max_attempts', 'run_at',
+        'locked_by', 'created',
+    )
+    list_filter = ('status', 'name')
+    readonly_fields = (
+        'name', 'args', 'kwargs', 'status', 'attempts', 'max_attempts',
+        'run_at', 'locked_until', 'locked_by', 'last_error', 'created',
+    )
+    actions = ('retry',)
+    empty_value_display = '-пусто-'
+
+    def retry(self, request, queryset):
+        queryset.update(
+            status=Task.QUEUED, attempts=0, run_at=timezone.now(),
+            locked_until=None,
+        )
+
+    retry.short_description = 'Запустить заново'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(Task, TaskAdmin)
+
+
+class TaskStatAdmin(admin.ModelAdmin):
+    """Итоги задач, накопленные воркерами; записи только читаются."""
+    list_display = ('name', 'outcome', 'count', 'seconds')
+    list_filter = ('outcome',)
+    search_fields = ('name',)
+    readonly_fields = ('name', 'outcome', 'count', 'seconds')
+    empty_value_display = '-пусто-'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(TaskStat, TaskStatAdmin)
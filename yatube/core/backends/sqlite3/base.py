@@ -0,0 +1,32 @@
+from django.db.backends.sqlite3 import base
+
+# Ключи OPTIONS, которые обрабатывает этот backend, а не sqlite3.connect().
+OWN_OPTIONS = ('pragmas', 'transaction_mode')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite с настройкой соединения и режимом начала транзакций.
+
+    ``OPTIONS['pragmas']`` выполняются на каждом новом соединении.
+    ``OPTIONS['transaction_mode'] = 'IMMEDIATE'`` начинает ``atomic()``
+    с ``BEGIN IMMEDIATE``: блокировка записи берётся сразу и ждёт
+    ``busy_timeout``, а не падает с «database is locked» при попытке
+    писать после чтения.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for option in OWN_OPTIONS:
+            params.pop(option, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = self.settings_dict['OPTIONS'].get('pragmas', {})
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,118 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.functional import cached_property
+
+from .metrics import count_event
+
+MISSING = object()
+
+
+class TwoTierCache(BaseCache):
+    """Локальный LRU (L1) перед общим кэшем (L2).
+
+    ``LOCATION`` — алиас общего кэша из ``settings.CACHES``. L1 живёт в
+    процессе воркера и хранит значения не дольше ``L1_TIMEOUT`` секунд,
+    поэтому запись из другого воркера видна с этой задержкой. ``add``,
+    ``incr`` и ``decr`` всегда идут в L2 — на них держатся блокировки и
+    счётчики поколений.
+
+    Попадания в L1 и L2 и промахи обоих уровней уходят в
+    ``core.metrics`` как ``cache_l1_hits``, ``cache_l2_hits`` и
+    ``cache_l2_misses`` и видны на /metrics/.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self._l1_timeout = options.get('L1_TIMEOUT', 2)
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @cached_property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_key(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def _remember(self, key, value, timeout, version):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is not None and timeout <= 0:
+            return
+        ttl = self._l1_timeout if timeout is None else min(
+            self._l1_timeout, timeout
+        )
+        local_key = self._local_key(key, version)
+        with self._lock:
+            self._local[local_key] = (time.monotonic() + ttl, pickle.dumps(
+                value, pickle.HIGHEST_PROTOCOL
+            ))
+            self._local.move_to_end(local_key)
+            while len(self._local) > self._max_entries:
+                self._local.popitem(last=False)
+
+    def _forget(self, key, version):
+        with self._lock:
+            self._local.pop(self._local_key(key, version), None)
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        with self._lock:
+            item = self._local.get(local_key)
+            if item is not None and item[0] > time.monotonic():
+                self._local.move_to_end(local_key)
+                value = pickle.loads(item[1])
+            else:
+                value = MISSING
+                self._local.pop(local_key, None)
+        if value is not MISSING:
+            count_event('cache_l1_hits')
+            return value
+
+        value = self.shared.get(key, MISSING, version=version)
+        if value is MISSING:
+            count_event('cache_l2_misses')
+            return default
+        count_event('cache_l2_hits')
+        self._remember(key, value, None, version)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._remember(key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._remember(key, value, timeout, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._forget(key, version)
+        self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version=version) is not MISSING
+
+    def incr(self, key, delta=1, version=None):
+        self._forget(key, version)
+        return self.shared.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._forget(key, version)
+        return self.shared.decr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
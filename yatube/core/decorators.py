@@ -0,0 +1,89 @@
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """View сделал больше запросов к базе, чем заявлено."""
+
+
+def query_budget(max_queries):
+    """Заявить предельное число SQL-запросов для view.
+
+    Лимит хранится в атрибуте ``query_budget`` обёрнутой функции. При
+    ``QUERY_BUDGET_STRICT = True`` (в тестах) превышение роняет запрос,
+    иначе в DEBUG пишется предупреждение в лог.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+            if not (strict or settings.DEBUG):
+                return view(request, *args, **kwargs)
+
+            queries = []
+
+            def count(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            # Считаются запросы ко всем базам: чтения идут на реплики.
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(count))
+                response = view(request, *args, **kwargs)
+            if len(queries) > max_queries:
+                message = (
+                    f'{view.__name__}: {len(queries)} SQL-запросов '
+                    f'при бюджете {max_queries}'
+                )
+                if strict:
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
+
+
+_write_lock = threading.RLock()
+
+
+@contextmanager
+def write_transaction(using=None):
+    """Транзакция записи, по одной на процесс для SQLite.
+
+    SQLite допускает одного писателя на всю базу: потоки процесса
+    выстраиваются в очередь на блокировке, а не крутятся в ожидании
+    ``busy_timeout``. Другие процессы ждут на ``BEGIN IMMEDIATE``.
+    """
+    if connections[using or DEFAULT_DB_ALIAS].vendor != 'sqlite':
+        with transaction.atomic(using=using):
+            yield
+        return
+    with _write_lock, transaction.atomic(using=using):
+        yield
+
+
+def single_writer(methods=('POST',)):
+    """Выполнять view с методом из ``methods`` в ``write_transaction``.
+
+    Все записи запроса фиксируются одним коммитом, а остальные методы,
+    например показ формы, обходятся без блокировки записи.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return view(request, *args, **kwargs)
+            with write_transaction():
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
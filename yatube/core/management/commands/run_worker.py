@@ -0,0 +1,35 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.tasks import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди в таблице core_task: '
+        'с повторами, экспоненциальной задержкой и таймаутом видимости. '
+        'SIGTERM и Ctrl+C дожидаются выполняемых задач.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.TASK_WORKERS,
+            help='Число потоков; 0 — выполнять задачи в основном потоке.',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=settings.TASK_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, секунды.',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда готовых задач не останется.',
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(options['concurrency'], options['poll'])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        processed = worker.run(burst=options['burst'])
+        self.stdout.write(f'Выполнено задач: {processed}')
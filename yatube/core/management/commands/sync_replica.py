@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.routers import synced_key
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик через backup API. '
+        'Заменяет репликацию при локальной работе: с --interval команда '
+        'повторяет копирование, и реплики отстают не больше интервала.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять копирование каждые N секунд.',
+        )
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError(
+                'Команда нужна только для SQLite: у других баз своя '
+                'репликация.'
+            )
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены: задайте DB_REPLICAS.')
+        while True:
+            self.sync(primary)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def sync(self, primary):
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            replica = connections[alias]
+            replica.ensure_connection()
+            # Изменения, закоммиченные до начала копирования, в реплике
+            # уже есть: по этому времени считается её поколение лент.
+            started = time.time_ns()
+            primary.connection.backup(replica.connection)
+            cache.set(synced_key(alias), started, None)
+            self.stdout.write(f'{alias}: скопировано')
@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates, Template
+
+# Границы корзин гистограммы времени ответа, секунды.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Замеры одного запроса: сумма времени и число событий по имени."""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, name, seconds=None, count=1):
+        if seconds is not None:
+            self.seconds[name] += seconds
+        self.counts[name] += count
+
+
+class Registry:
+    """Накопленные метрики процесса в формате Prometheus.
+
+    Счётчики живут в памяти воркера: каждый процесс отдаёт свои, а
+    Prometheus различает их по метке ``instance``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._requests = defaultdict(int)
+            self._views = defaultdict(int)
+            self._buckets = defaultdict(lambda: [0] * len(BUCKETS))
+            self._seconds = defaultdict(float)
+            self._counts = defaultdict(int)
+
+    def observe_request(self, view, status, seconds, stats):
+        with self._lock:
+            self._requests[view, status] += 1
+            self._views[view] += 1
+            buckets = self._buckets[view]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self._seconds['request', view] += seconds
+            for name, value in stats.seconds.items():
+                self._seconds[name, view] += value
+            for name, value in stats.counts.items():
+                self._counts[name, view] += value
+
+    def observe(self, name, seconds=None, count=1, view=''):
+        with self._lock:
+            if seconds is not None:
+                self._seconds[name, view] += seconds
+            self._counts[name, view] += count
+
+    def render(self):
+        with self._lock:
+            lines = ['# TYPE yatube_requests_total counter']
+            for (view, status), value in sorted(self._requests.items()):
+                lines.append(
+                    f'yatube_requests_total{{view="{view}",'
+                    f'status="{status}"}} {value}'
+                )
+            lines.append('# TYPE yatube_request_seconds histogram')
+            for view, buckets in sorted(self._buckets.items()):
+                labels = f'view="{view}"'
+                for bound, value in zip(BUCKETS, buckets):
+                    lines.append(
+                        f'yatube_request_seconds_bucket{{{labels},'
+                        f'le="{bound}"}} {value}'
+                    )
+                lines += [
+                    f'yatube_request_seconds_bucket{{{labels},le="+Inf"}} '
+                    f'{self._views[view]}',
+                    f'yatube_request_seconds_sum{{{labels}}} '
+                    f'{self._seconds["request", view]:.6f}',
+                    f'yatube_request_seconds_count{{{labels}}} '
+                    f'{self._views[view]}',
+                ]
+            lines += self._render_counters(
+                self._counts, '_total', lambda value: value
+            )
+            seconds = {
+                key: value for key, value in self._seconds.items()
+                if key[0] != 'request'
+            }
+            lines += self._render_counters(
+                seconds, '_seconds_total', lambda value: f'{value:.6f}'
+            )
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_counters(values, suffix, fmt):
+        lines = []
+        for name in sorted({name for name, _ in values}):
+            lines.append(f'# TYPE yatube_{name}{suffix} counter')
+            lines += [
+                f'yatube_{name}{suffix}{{view="{view}"}} {fmt(value)}'
+                for (metric, view), value in sorted(values.items())
+                if metric == name
+            ]
+        return lines
+
+
+registry = Registry()
+
+
+def current_stats():
+    return _current.get()
+
+
+@contextmanager
+def collect():
+    """Собирать замеры в ``RequestStats`` на время блока."""
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """Засечь время блока: в замеры запроса, а вне запроса — в процесс."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stats = _current.get()
+        if stats is not None:
+            stats.add(name, seconds)
+        else:
+            registry.observe(name, seconds)
+
+
+def count_event(name, count=1):
+    """Отметить ``count`` событий: в замеры запроса, а вне запроса — в
+    процесс."""
+    stats = _current.get()
+    if stats is not None:
+        stats.add(name, count=count)
+    else:
+        registry.observe(name, count=count)
+
+
+def count_cache(name, hit, count=1):
+    """Отметить ``count`` попаданий или промахов кэша ``name``."""
+    if not count:
+        return
+    outcome = 'hits' if hit else 'misses'
+    for metric in (f'cache_{outcome}', f'cache_{name}_{outcome}'):
+        count_event(metric, count)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Шаблоны Django с замером времени рендеринга верхнего уровня."""
+
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return TimedTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,128 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import collect, registry
+from .routers import replica_reads
+from .slow_queries import slow_query_wrapper
+
+
+def _record_query(stats, execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add('db', time.perf_counter() - start)
+
+
+def server_timing(seconds, stats):
+    """Заголовок ``Server-Timing``: длительности в миллисекундах."""
+    parts = [f'total;dur={seconds * 1000:.1f}']
+    for name, value in sorted(stats.seconds.items()):
+        parts.append(
+            f'{name};dur={value * 1000:.1f};desc="{stats.counts[name]}"'
+        )
+    hits = stats.counts.get('cache_hits', 0)
+    misses = stats.counts.get('cache_misses', 0)
+    if hits or misses:
+        parts.append(f'cache;desc="hits={hits} misses={misses}"')
+    return ', '.join(parts)
+
+
+class PerformanceMiddleware:
+    """Время view, запросы к базе, шаблоны, кэш и миниатюры по запросу.
+
+    Замеряется доля ``PERF_SAMPLE_RATE`` запросов; остальные проходят без
+    обёрток. Итоги копятся в ``core.metrics.registry`` и, при
+    ``PERF_SERVER_TIMING``, уходят в заголовок ``Server-Timing``.
+    Middleware должен стоять первым, чтобы видеть полное время ответа.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.PERF_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with collect() as stats, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    lambda *args: _record_query(stats, *args)
+                ))
+            response = self.get_response(request)
+        seconds = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        registry.observe_request(view, response.status_code, seconds, stats)
+        if settings.PERF_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(seconds, stats)
+        return response
+
+
+class SlowQueryMiddleware:
+    """Журнал запросов к базе дольше ``SLOW_QUERY_MS`` миллисекунд.
+
+    Медленный запрос пишется в лог и в ``SlowQuery`` вместе с view, местом
+    вызова и планом. ``SLOW_QUERY_MS = None`` выключает журнал.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.SLOW_QUERY_MS is None:
+            return self.get_response(request)
+
+        def view_name():
+            match = getattr(request, 'resolver_match', None)
+            return match.view_name if match else request.path
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    slow_query_wrapper(view_name)
+                ))
+            return self.get_response(request)
+
+
+class ReplicaMiddleware:
+    """Чтение с реплик для GET и HEAD с «липкой» основной базой.
+
+    Запрос с другим методом или с записью в базу ставит cookie
+    ``REPLICA_STICKY_COOKIE``: следующие ``REPLICA_STICKY_SECONDS`` секунд
+    этот браузер читает основную базу и видит свои изменения, даже если
+    реплика отстаёт.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        unsafe = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        with replica_reads(unsafe or self.is_sticky(request)) as state:
+            response = self.get_response(request)
+        if unsafe or state.wrote:
+            seconds = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, int(time.time() + seconds),
+                max_age=seconds, httponly=True, samesite='Lax',
+            )
+        return response
+
+    @staticmethod
+    def is_sticky(request):
+        try:
+            until = int(request.COOKIES[settings.REPLICA_STICKY_COOKIE])
+        except (KeyError, ValueError):
+            return False
+        return until > time.time()
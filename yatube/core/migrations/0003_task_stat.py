@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Задача')),
+                ('outcome', models.CharField(choices=[('succeeded', 'Выполнена'), ('retried', 'Отложена на повтор'), ('failed', 'Ошибка')], max_length=10, verbose_name='Исход')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Число запусков')),
+                ('seconds', models.FloatField(default=0, verbose_name='Суммарное время, с')),
+            ],
+            options={
+                'verbose_name': 'Итоги задачи',
+                'verbose_name_plural': 'Итоги задач',
+                'ordering': ('name', 'outcome'),
+                'unique_together': {('name', 'outcome')},
+            },
+        ),
+    ]
@@ -11,3 +11,90 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class SlowQuery(models.Model):
+    """Медленные запросы, сгруппированные по нормализованному SQL."""
+    fingerprint = models.CharField('Отпечаток', max_length=32, unique=True)
+    sql = models.TextField('Нормализованный SQL')
+    view = models.CharField('Последний view', max_length=200, blank=True)
+    call_site = models.CharField('Место вызова', max_length=300, blank=True)
+    plan = models.TextField('План запроса', blank=True)
+    calls = models.PositiveIntegerField('Число вызовов', default=0)
+    total_ms = models.FloatField('Суммарное время, мс', default=0)
+    max_ms = models.FloatField('Максимальное время, мс', default=0)
+    first_seen = models.DateTimeField('Впервые', auto_now_add=True)
+    last_seen = models.DateTimeField('Последний раз')
+
+    class Meta:
+        ordering = ('-total_ms',)
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+
+    def __str__(self):
+        return self.sql[:80]
+
+
+class Task(models.Model):
+    """Задача фоновой очереди; выполняет её ``manage.py run_worker``."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=200)
+    args = models.TextField('Аргументы, JSON', default='[]')
+    kwargs = models.TextField('Именованные аргументы, JSON', default='{}')
+    status = models.CharField(
+        'Статус', max_length=10, choices=STATUSES, default=QUEUED
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveIntegerField('Попыток не больше')
+    run_at = models.DateTimeField('Выполнить не раньше')
+    locked_until = models.DateTimeField('Занята до', null=True, blank=True)
+    locked_by = models.CharField('Воркер', max_length=100, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        ordering = ('run_at',)
+        indexes = (models.Index(fields=('status', 'run_at')),)
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+
+class TaskStat(models.Model):
+    """Итоги выполнения задач по имени и исходу.
+
+    Воркер — отдельный процесс, и его счётчики в памяти Prometheus не
+    видит; веб-процесс отдаёт их на /metrics/ из этой таблицы.
+    """
+    SUCCEEDED = 'succeeded'
+    RETRIED = 'retried'
+    FAILED = 'failed'
+    OUTCOMES = (
+        (SUCCEEDED, 'Выполнена'),
+        (RETRIED, 'Отложена на повтор'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=200)
+    outcome = models.CharField('Исход', max_length=10, choices=OUTCOMES)
+    count = models.PositiveIntegerField('Число запусков', default=0)
+    seconds = models.FloatField('Суммарное время, с', default=0)
+
+    class Meta:
+        ordering = ('name', 'outcome')
+        unique_together = ('name', 'outcome')
+        verbose_name = 'Итоги задачи'
+        verbose_name_plural = 'Итоги задач'
+
+    def __str__(self):
+        return f'{self.name}: {self.outcome}'
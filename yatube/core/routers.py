@@ -0,0 +1,75 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+_current = ContextVar('replica_state', default=None)
+
+
+class ReplicaState:
+    """Выбор базы для чтения на время одного запроса."""
+
+    def __init__(self, primary):
+        self.replica = random.choice(settings.DATABASE_REPLICAS)
+        self.primary = primary
+        self.wrote = False
+
+
+@contextmanager
+def replica_reads(primary=False):
+    """Читать с реплики внутри блока; ``primary=True`` — с основной базы."""
+    state = ReplicaState(primary)
+    token = _current.set(state)
+    try:
+        yield state
+    finally:
+        _current.reset(token)
+
+
+def synced_key(alias):
+    return f'replica:{alias}:synced'
+
+
+def replica_synced_at():
+    """Время начала последнего копирования в реплику, с которой читает
+    текущий запрос, в наносекундах.
+
+    ``None``, если запрос читает основную базу или реплику не отмечала
+    ``sync_replica``: такая реплика считается догнавшей основную базу.
+    """
+    state = _current.get()
+    if state is None or state.primary:
+        return None
+    return cache.get(synced_key(state.replica))
+
+
+class ReplicaRouter:
+    """Чтение — с реплики, запись — в основную базу.
+
+    Реплики используются только внутри запроса, размеченного
+    ``ReplicaMiddleware``: команды, фоновые потоки и тесты читают основную
+    базу. После первой записи запрос до конца читает основную базу, чтобы
+    видеть свои изменения.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None or state.primary:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.primary = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплики получают схему вместе с данными основной базы.
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import os
+import re
+import time
+import traceback
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (
+    DEFAULT_DB_ALIAS, DatabaseError, IntegrityError, transaction,
+)
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+# План одного отпечатка снимается не чаще раза в этот срок, секунды.
+EXPLAIN_INTERVAL = 3600
+
+_recording = ContextVar('slow_query_recording', default=False)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'IN \(\?(?:, \?)*\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+_DJANGO_DB = os.path.join('django', 'db', '')
+
+
+def normalize(sql):
+    """SQL без значений: строки, числа и списки IN заменены на ``?``."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def call_site():
+    """Ближайший к запросу кадр кода проекта: ``путь:строка в функции``.
+
+    Кадры после входа в ORM пропускаются: там обёртки ``execute_wrapper``.
+    """
+    stack = traceback.extract_stack()
+    entry = next(
+        (i for i, frame in enumerate(stack) if _DJANGO_DB in frame.filename),
+        len(stack),
+    )
+    for frame in reversed(stack[:entry]):
+        if not frame.filename.startswith(settings.BASE_DIR):
+            continue
+        if 'site-packages' in frame.filename:
+            continue
+        path = os.path.relpath(frame.filename, settings.BASE_DIR)
+        return f'{path}:{frame.lineno} in {frame.name}'
+    return ''
+
+
+def explain(connection, sql, params):
+    """План запроса или пустая строка для запросов, кроме SELECT."""
+    prefix = EXPLAIN.get(connection.vendor)
+    if prefix is None or not sql.lstrip().upper().startswith(
+        ('SELECT', 'WITH')
+    ):
+        return ''
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        rows = cursor.fetchall()
+    return '\n'.join(' '.join(str(value) for value in row) for row in rows)
+
+
+def record(connection, sql, params, many, seconds, view):
+    """Записать медленный запрос: в лог и в таблицу ``SlowQuery``."""
+    from .models import SlowQuery
+
+    token = _recording.set(True)
+    try:
+        normalized = normalize(sql)
+        key = hashlib.md5(normalized.encode()).hexdigest()
+        site = call_site()
+        plan = ''
+        if not many and cache.add(
+            f'core:slow_query:explained:{key}', True, EXPLAIN_INTERVAL
+        ):
+            plan = explain(connection, sql, params)
+        ms = seconds * 1000
+        logger.warning(
+            'Медленный запрос %.1f мс в %s (%s): %s\n%s',
+            ms, view, site, normalized, plan,
+        )
+
+        changes = {
+            'calls': F('calls') + 1,
+            'total_ms': F('total_ms') + ms,
+            'max_ms': Greatest(F('max_ms'), ms),
+            'last_seen': timezone.now(),
+            'view': view[:200],
+            'call_site': site[:300],
+        }
+        if plan:
+            changes['plan'] = plan
+        # Точка сохранения: сбой записи не должен ломать транзакцию запроса.
+        # База указана явно: служебная запись не делает чтение «липким».
+        using = DEFAULT_DB_ALIAS
+        with transaction.atomic(using=using):
+            queries = SlowQuery.objects.using(using)
+            if queries.filter(fingerprint=key).update(**changes):
+                return
+            try:
+                with transaction.atomic(using=using):
+                    queries.create(
+                        fingerprint=key, sql=normalized, plan=plan,
+                        calls=1, total_ms=ms, max_ms=ms,
+                        last_seen=changes['last_seen'],
+                        view=view[:200], call_site=site[:300],
+                    )
+            except IntegrityError:
+                queries.filter(fingerprint=key).update(**changes)
+    except DatabaseError:
+        logger.exception('Не удалось записать медленный запрос')
+    finally:
+        _recording.reset(token)
+
+
+def slow_query_wrapper(view_name):
+    """Обёртка ``execute_wrapper``: запросы дольше ``SLOW_QUERY_MS``
+    попадают в журнал. ``view_name`` вызывается, когда запрос уже медленный,
+    поэтому имя view определяется после разбора URL."""
+    def wrapper(execute, sql, params, many, context):
+        if _recording.get():
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        seconds = time.perf_counter() - start
+        if seconds * 1000 >= settings.SLOW_QUERY_MS:
+            record(
+                context['connection'], sql, params, many, seconds,
+                view_name(),
+            )
+        return result
+    return wrapper
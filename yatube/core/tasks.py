@@ -0,0 +1,318 @@
+import functools
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .metrics import registry
+from .models import Task, TaskStat
+
+logger = logging.getLogger(__name__)
+
+
+class TaskFunction:
+    """Функция, которую можно вызвать сразу или поставить в очередь."""
+
+    def __init__(self, func, max_attempts=None, retry_delay=None,
+                 timeout=None):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = f'{func.__module__}.{func.__name__}'
+        self.max_attempts = max_attempts or settings.TASK_MAX_ATTEMPTS
+        self.retry_delay = retry_delay or settings.TASK_RETRY_DELAY
+        self.timeout = timeout or settings.TASK_VISIBILITY_TIMEOUT
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Поставить вызов в очередь.
+
+        Запись создаётся в текущей транзакции: воркер увидит задачу только
+        после коммита, а при откате её не будет вовсе. Аргументы должны
+        сериализоваться в JSON. При ``TASKS_EAGER`` задача выполняется
+        после коммита в текущем потоке.
+        """
+        if settings.TASKS_EAGER:
+            transaction.on_commit(lambda: self.func(*args, **kwargs))
+            return None
+        record = Task.objects.create(
+            name=self.name,
+            args=json.dumps(args),
+            kwargs=json.dumps(kwargs),
+            max_attempts=self.max_attempts,
+            run_at=timezone.now(),
+        )
+        registry.observe('tasks_enqueued', view=self.name)
+        return record
+
+    def retry_at(self, attempt):
+        """Экспоненциальная задержка с разбросом, чтобы повторы после
+        общего сбоя не приходили одной волной."""
+        seconds = min(
+            self.retry_delay * 2 ** (attempt - 1),
+            settings.TASK_MAX_RETRY_DELAY,
+        )
+        return timezone.now() + timedelta(
+            seconds=seconds * random.uniform(1, 1.25)
+        )
+
+
+def task(func=None, *, max_attempts=None, retry_delay=None, timeout=None):
+    """Декоратор фоновой задачи для функций уровня модуля.
+
+    ``timeout`` — таймаут видимости: если воркер не отчитался за это
+    время, задачу заберёт другой воркер.
+    """
+    def decorate(func):
+        return TaskFunction(func, max_attempts, retry_delay, timeout)
+
+    return decorate(func) if func is not None else decorate
+
+
+@functools.lru_cache(maxsize=None)
+def resolve(name):
+    function = import_string(name)
+    if not isinstance(function, TaskFunction):
+        raise ImportError(f'{name} не объявлена через @task')
+    return function
+
+
+def record_outcome(name, outcome, count=1, seconds=0):
+    """Прибавить запуски к итогам задачи в ``TaskStat``."""
+    changes = {
+        'count': F('count') + count,
+        'seconds': F('seconds') + seconds,
+    }
+    stats = TaskStat.objects.filter(name=name, outcome=outcome)
+    if stats.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            TaskStat.objects.create(
+                name=name, outcome=outcome, count=count, seconds=seconds
+            )
+    except IntegrityError:
+        stats.update(**changes)
+
+
+def expire(now):
+    """Пометить ошибкой задачи, которые истратили попытки и не вернулись."""
+    lost = Task.objects.filter(
+        status=Task.RUNNING, locked_until__lt=now,
+        attempts__gte=F('max_attempts'),
+    )
+    names = lost.order_by().values_list('name', flat=True).distinct()
+    for name in list(names):
+        count = lost.filter(name=name).update(
+            status=Task.FAILED, locked_until=None,
+            last_error='Воркер не отчитался до конца таймаута видимости',
+        )
+        if count:
+            record_outcome(name, TaskStat.FAILED, count=count)
+
+
+def claim(worker_id, limit):
+    """Занять до ``limit`` готовых задач.
+
+    Готова задача из очереди, срок которой наступил, и выполняемая, чей
+    таймаут видимости истёк. Каждая задача занимается условным UPDATE:
+    из нескольких воркеров его выполнит только один.
+    """
+    now = timezone.now()
+    expire(now)
+    candidates = Task.objects.filter(
+        Q(status=Task.QUEUED, run_at__lte=now)
+        | Q(status=Task.RUNNING, locked_until__lt=now)
+    ).order_by('run_at').values_list(
+        'pk', 'name', 'status', 'locked_until'
+    )[:limit]
+    claimed = []
+    for pk, name, status, locked_until in candidates:
+        try:
+            timeout = resolve(name).timeout
+        except ImportError as error:
+            Task.objects.filter(pk=pk).update(
+                status=Task.FAILED, last_error=str(error)
+            )
+            continue
+        taken = Task.objects.filter(
+            pk=pk, status=status, locked_until=locked_until
+        ).update(
+            status=Task.RUNNING,
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=timeout),
+            attempts=F('attempts') + 1,
+        )
+        if taken:
+            claimed.append(Task.objects.get(pk=pk))
+    return claimed
+
+
+def execute(record):
+    """Выполнить занятую задачу и записать результат.
+
+    Запись меняется, только пока задача занята этим же воркером и этой же
+    попыткой: после истечения таймаута её мог забрать другой воркер.
+    """
+    function = resolve(record.name)
+    mine = Task.objects.filter(
+        pk=record.pk, locked_by=record.locked_by, attempts=record.attempts
+    )
+    start = time.perf_counter()
+    try:
+        function.func(
+            *json.loads(record.args), **json.loads(record.kwargs)
+        )
+    except Exception:
+        logger.exception('Задача %s упала', record)
+        error = traceback.format_exc()
+        if record.attempts < record.max_attempts:
+            mine.update(
+                status=Task.QUEUED, locked_until=None, last_error=error,
+                run_at=function.retry_at(record.attempts),
+            )
+            outcome = TaskStat.RETRIED
+        else:
+            mine.update(
+                status=Task.FAILED, locked_until=None, last_error=error
+            )
+            outcome = TaskStat.FAILED
+    else:
+        mine.delete()
+        outcome = TaskStat.SUCCEEDED
+    record_outcome(
+        record.name, outcome, seconds=time.perf_counter() - start
+    )
+    return outcome
+
+
+def queue_stats():
+    """Число задач по статусам и возраст самой старой готовой задачи."""
+    counts = dict(
+        Task.objects.order_by().values_list('status').annotate(Count('pk'))
+    )
+    oldest = Task.objects.filter(
+        status=Task.QUEUED, run_at__lte=timezone.now()
+    ).aggregate(oldest=Min('run_at'))['oldest']
+    return {
+        'counts': {
+            status: counts.get(status, 0) for status, _ in Task.STATUSES
+        },
+        'oldest_seconds': (
+            (timezone.now() - oldest).total_seconds() if oldest else 0
+        ),
+    }
+
+
+def render_queue_metrics():
+    """Очередь и итоги задач из базы: воркер считает их в своём процессе,
+    а отдаёт веб-процесс."""
+    stats = queue_stats()
+    lines = ['# TYPE yatube_tasks gauge']
+    lines += [
+        f'yatube_tasks{{status="{status}"}} {count}'
+        for status, count in stats['counts'].items()
+    ]
+    lines += [
+        '# TYPE yatube_tasks_oldest_seconds gauge',
+        f'yatube_tasks_oldest_seconds {stats["oldest_seconds"]:.3f}',
+    ]
+    outcomes = list(TaskStat.objects.values_list(
+        'name', 'outcome', 'count', 'seconds'
+    ))
+    lines.append('# TYPE yatube_task_runs_total counter')
+    lines += [
+        f'yatube_task_runs_total{{task="{name}",outcome="{outcome}"}} '
+        f'{count}'
+        for name, outcome, count, _ in outcomes
+    ]
+    lines.append('# TYPE yatube_task_seconds_total counter')
+    lines += [
+        f'yatube_task_seconds_total{{task="{name}",outcome="{outcome}"}} '
+        f'{seconds:.3f}'
+        for name, outcome, _, seconds in outcomes
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+class Worker:
+    """Цикл воркера: занимает задачи и выполняет их в пуле потоков.
+
+    При ``concurrency = 0`` задачи выполняются в текущем потоке.
+    """
+
+    def __init__(self, concurrency, poll_interval):
+        self.id = f'{socket.gethostname()}:{os.getpid()}'
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+        self.processed = 0
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run(self, burst=False):
+        """Работать до ``stop()``; с ``burst`` — пока есть готовые задачи."""
+        if self.concurrency:
+            self._run_pool(burst)
+        else:
+            self._run_inline(burst)
+        return self.processed
+
+    def _run_inline(self, burst):
+        while not self.stopping.is_set():
+            claimed = claim(self.id, 1)
+            for record in claimed:
+                execute(record)
+                self.processed += 1
+            if not claimed:
+                if burst:
+                    break
+                self.stopping.wait(self.poll_interval)
+
+    def _run_pool(self, burst):
+        running = set()
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix='tasks'
+        ) as pool:
+            while not self.stopping.is_set():
+                free = self.concurrency - len(running)
+                claimed = claim(self.id, free) if free else []
+                running |= {
+                    pool.submit(self._execute_in_thread, record)
+                    for record in claimed
+                }
+                if not running:
+                    if burst:
+                        break
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                done, running = wait(
+                    running, self.poll_interval, return_when=FIRST_COMPLETED
+                )
+                self.processed += len(done)
+        self.processed += len(running)
+
+    @staticmethod
+    def _execute_in_thread(record):
+        try:
+            execute(record)
+        except Exception:
+            # Упала запись результата: задача останется занятой и после
+            # таймаута видимости выполнится ещё раз.
+            logger.exception('Не удалось записать результат %s', record)
+        finally:
+            connections.close_all()
@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..metrics import registry
+
+CACHE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'L1_MAX_ENTRIES': 2, 'L1_TIMEOUT': 60},
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+    },
+})
+class TwoTierCacheTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        registry.reset()
+
+    def test_hits_counted_per_tier(self):
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertIsNone(self.cache.get('missing'))
+
+        self.cache._local.clear()
+        self.assertEqual(self.cache.get('key'), 'value')
+
+        with self.settings(PERF_METRICS_TOKEN='secret'):
+            body = self.client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+            ).content.decode()
+        for metric in ('l1_hits', 'l2_hits', 'l2_misses'):
+            self.assertIn(f'yatube_cache_{metric}_total{{view=""}} 1', body)
+
+    def test_local_tier_is_bounded_lru(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.assertEqual(len(self.cache._local), 2)
+        self.assertEqual(self.cache.get('a'), 'a')
+        self.assertIn(
+            'yatube_cache_l2_hits_total{view=""} 1', registry.render()
+        )
+        self.assertNotIn('yatube_cache_l1_hits_total', registry.render())
+
+    def test_incr_goes_to_shared_tier(self):
+        self.cache.set('counter', 1)
+        self.cache.incr('counter')
+        self.assertEqual(caches['shared'].get('counter'), 2)
+        self.assertEqual(self.cache.get('counter'), 2)
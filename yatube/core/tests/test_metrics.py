@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..metrics import registry
+
+
+@override_settings(
+    PERF_SAMPLE_RATE=1, PERF_SERVER_TIMING=True, PERF_METRICS_TOKEN='secret'
+)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertIn('template;dur=', timing)
+        self.assertIn('cache;desc="hits=0 misses=1"', timing)
+
+        timing = self.client.get(reverse('posts:index'))['Server-Timing']
+        self.assertIn('cache;desc="hits=1 misses=0"', timing)
+        self.assertNotIn('template', timing)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        body = response.content.decode()
+        self.assertIn(
+            'yatube_requests_total{view="posts:index",status="200"} 1', body
+        )
+        self.assertIn(
+            'yatube_request_seconds_count{view="posts:index"} 1', body
+        )
+        self.assertIn('yatube_db_total{view="posts:index"}', body)
+        self.assertIn('yatube_cache_feed_misses_total', body)
+
+    def test_metrics_require_token(self):
+        for header in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            with self.subTest(header=header):
+                response = self.client.get(reverse('metrics'), **header)
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(PERF_METRICS_TOKEN=None)
+    def test_metrics_closed_without_token_setting(self):
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer None'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(PERF_METRICS_IPS=('10.0.0.1',))
+    def test_metrics_open_to_trusted_addresses(self):
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='10.0.0.1'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_unsampled_requests_not_measured(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('posts:index', registry.render())
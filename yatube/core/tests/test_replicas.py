@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from ..decorators import QueryBudgetExceeded, query_budget
+from ..routers import ReplicaRouter, replica_reads
+
+REPLICA = 'replica'
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Основная тестовая база и реплика в отдельном файле SQLite."""
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases[REPLICA] = {
+            **connections.databases[DEFAULT_DB_ALIAS],
+            'NAME': os.path.join(TEMP_DIR, 'replica.sqlite3'),
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='auth')
+        Post.objects.create(author=self.author, text='Уже на реплике')
+        self.sync()
+        Post.objects.create(author=self.author, text='Только в основной')
+
+    def sync(self):
+        call_command('sync_replica', stdout=open(os.devnull, 'w'))
+
+    def index(self):
+        cache.clear()
+        return self.client.get(reverse('posts:index')).content.decode()
+
+    def test_query_budget_counts_replica_reads(self):
+        @query_budget(0)
+        def view(request):
+            return list(Post.objects.using(REPLICA).all())
+
+        with self.settings(QUERY_BUDGET_STRICT=True):
+            with self.assertRaises(QueryBudgetExceeded):
+                view(None)
+
+    def test_get_reads_replica(self):
+        page = self.index()
+        self.assertIn('Уже на реплике', page)
+        self.assertNotIn('Только в основной', page)
+
+        self.sync()
+        self.assertIn('Только в основной', self.index())
+
+    def test_post_makes_reads_sticky(self):
+        response = self.client.post(reverse('posts:post_create'))
+        cookie = response.cookies[settings.REPLICA_STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_STICKY_SECONDS)
+        self.assertIn('Только в основной', self.index())
+
+        self.client.cookies[settings.REPLICA_STICKY_COOKIE] = int(
+            time.time() - 1
+        )
+        self.assertNotIn('Только в основной', self.index())
+
+    def test_feed_cache_and_etag_follow_replica(self):
+        cache.clear()
+        self.sync()
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(author=self.author, text='После копирования')
+
+        # Реплика ещё не догнала основную базу: страница и ETag прежние.
+        response = self.client.get(url)
+        self.assertEqual(response['ETag'], etag)
+        self.assertNotIn('После копирования', response.content.decode())
+
+        self.sync()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('После копирования', response.content.decode())
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+        with replica_reads() as state:
+            self.assertEqual(router.db_for_read(Post), REPLICA)
+            self.assertEqual(router.db_for_write(Post), DEFAULT_DB_ALIAS)
+            self.assertTrue(state.wrote)
+            self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+        self.assertFalse(router.allow_migrate(REPLICA, 'posts'))
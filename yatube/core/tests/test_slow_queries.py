@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from ..models import SlowQuery
+from ..slow_queries import normalize
+
+
+class NormalizeTests(TestCase):
+    def test_values_replaced(self):
+        self.assertEqual(
+            normalize(
+                "SELECT * FROM t1 WHERE a = 'x''y' AND b IN (%s, %s, %s)\n"
+                "  LIMIT 21"
+            ),
+            'SELECT * FROM t1 WHERE a = ? AND b IN (...) LIMIT ?',
+        )
+        self.assertEqual(
+            normalize('SELECT * FROM t WHERE id IN (%s)'),
+            normalize('SELECT * FROM t WHERE id IN (%s, %s)'),
+        )
+
+
+@override_settings(SLOW_QUERY_MS=0)
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_queries_aggregated_by_fingerprint(self):
+        with self.assertLogs('core.slow_queries', 'WARNING'):
+            self.client.get(reverse('posts:index'))
+        feed = SlowQuery.objects.get(
+            view='posts:index', sql__contains='FROM "posts_post"',
+            sql__endswith='LIMIT ?',
+        )
+        self.assertEqual(feed.calls, 1)
+        self.assertIn('posts/', feed.call_site)
+        self.assertIn('posts_post', feed.plan)
+
+        cache.clear()
+        with self.assertLogs('core.slow_queries', 'WARNING'):
+            self.client.get(reverse('posts:index'))
+        feed.refresh_from_db()
+        self.assertEqual(feed.calls, 2)
+        self.assertGreaterEqual(feed.total_ms, feed.max_ms)
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_disabled(self):
+        self.client.get(reverse('posts:index'))
+        self.assertFalse(SlowQuery.objects.exists())
+
+    def test_admin_page_for_staff_only(self):
+        url = reverse('admin:core_slowquery_changelist')
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        with self.assertLogs('core.slow_queries', 'WARNING'):
+            self.assertEqual(self.client.get(url).status_code, 302)
+            self.client.force_login(admin)
+            self.client.get(reverse('posts:index'))
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'posts:index')
@@ -0,0 +1,36 @@
+from unittest import skipUnless
+
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+
+from ..decorators import write_transaction
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Настройки только для SQLite')
+class SQLiteBackendTests(TransactionTestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        options = connection.settings_dict['OPTIONS']['pragmas']
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(
+            self.pragma('busy_timeout'), options['busy_timeout']
+        )
+        self.assertEqual(self.pragma('cache_size'), options['cache_size'])
+
+    def test_transactions_begin_immediate(self):
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            with write_transaction():
+                self.assertTrue(connection.in_atomic_block)
+            with transaction.atomic():
+                pass
+        self.assertEqual(statements, ['BEGIN IMMEDIATE'] * 2)
@@ -0,0 +1,125 @@
+import os
+from datetime import timedelta
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import User
+from ..models import Task
+from ..tasks import claim, execute, task
+
+CALLS = []
+
+
+@task
+def remember(value, other=None):
+    CALLS.append((value, other))
+
+
+@task(max_attempts=2, retry_delay=60)
+def broken():
+    raise ValueError('сломалось')
+
+
+def run_worker(concurrency=0):
+    call_command(
+        'run_worker', '--burst', f'--concurrency={concurrency}',
+        stdout=open(os.devnull, 'w'),
+    )
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_delay_runs_in_worker(self):
+        record = remember.delay(1, other='два')
+        self.assertEqual(record.name, f'{__name__}.remember')
+        self.assertEqual(CALLS, [])
+
+        run_worker()
+        self.assertEqual(CALLS, [(1, 'два')])
+        self.assertFalse(Task.objects.exists())
+
+    def test_retry_with_backoff_then_fail(self):
+        broken.delay()
+        with self.assertLogs('core.tasks', 'ERROR'):
+            run_worker()
+        record = Task.objects.get()
+        self.assertEqual(record.status, Task.QUEUED)
+        self.assertEqual(record.attempts, 1)
+        self.assertIn('ValueError', record.last_error)
+        self.assertGreaterEqual(
+            record.run_at, timezone.now() + timedelta(seconds=59)
+        )
+
+        # Срок повтора не наступил: воркеру нечего делать.
+        run_worker()
+        self.assertEqual(Task.objects.get().attempts, 1)
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.tasks', 'ERROR'):
+            run_worker()
+        record = Task.objects.get()
+        self.assertEqual(record.status, Task.FAILED)
+        self.assertEqual(record.attempts, 2)
+
+    def test_visibility_timeout(self):
+        remember.delay(1)
+        [first] = claim('first', 10)
+        self.assertEqual(claim('second', 10), [])
+
+        Task.objects.update(locked_until=timezone.now() - timedelta(1))
+        [second] = claim('second', 10)
+        self.assertEqual(second.attempts, 2)
+
+        # Опоздавший воркер выполняет задачу, но запись уже не его.
+        execute(first)
+        self.assertTrue(Task.objects.exists())
+        execute(second)
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(PERF_METRICS_TOKEN='secret')
+    def test_queue_metrics(self):
+        remember.delay(1)
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertContains(response, 'yatube_tasks{status="queued"} 1')
+        self.assertContains(response, 'yatube_tasks_oldest_seconds')
+
+    @override_settings(PERF_METRICS_TOKEN='secret')
+    def test_worker_outcomes_in_web_metrics(self):
+        remember.delay(1)
+        broken.delay()
+        with self.assertLogs('core.tasks', 'ERROR'):
+            run_worker()
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        for name, outcome in (('remember', 'succeeded'),
+                              ('broken', 'retried')):
+            self.assertContains(
+                response,
+                f'yatube_task_runs_total{{task="{__name__}.{name}",'
+                f'outcome="{outcome}"}} 1',
+            )
+        self.assertContains(response, 'yatube_task_seconds_total{')
+
+    def test_password_reset_email_sent_by_worker(self):
+        User.objects.create_user(
+            username='auth', email='auth@example.com', password='secret'
+        )
+        self.client.post(
+            reverse('users:password_reset_form'),
+            {'email': 'auth@example.com'},
+        )
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Task.objects.get().name, 'users.tasks.send_email')
+
+        run_worker()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['auth@example.com'])
@@ -1,5 +1,12 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from .metrics import registry
+from .tasks import render_queue_metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +18,27 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=403)
+
+
+def metrics_token_valid(request):
+    token = settings.PERF_METRICS_TOKEN
+    if not token:
+        return False
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+
+
+def metrics(request):
+    """Метрики процесса и очереди задач для Prometheus: по токену,
+    с доверенных адресов и для staff."""
+    allowed = (
+        metrics_token_valid(request)
+        or request.META.get('REMOTE_ADDR') in settings.PERF_METRICS_IPS
+        or request.user.is_staff
+    )
+    if not allowed:
+        raise Http404
+    return HttpResponse(
+        registry.render() + render_queue_metrics(),
+        content_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,106 @@
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_safe
+
+from core.decorators import query_budget
+from .conditional import feed_etag, follow_etag, post_etag
+from .counters import stats_for
+from .models import Group, Post, User
+from .paginators import paginate
+from .timeline import timeline_page
+from .views import POSTS_PER_PAGE
+
+
+def post_to_dict(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'created': post.created.isoformat(),
+        'updated': post.updated.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group else None,
+        'image': post.image.url if post.image else None,
+    }
+
+
+def page_response(request, posts, **extra):
+    return page_json(paginate(request, posts, POSTS_PER_PAGE), **extra)
+
+
+def page_json(page_obj, **extra):
+    paginator = page_obj.paginator
+    if getattr(paginator, 'keyset', False):
+        navigation = {
+            'next_cursor': paginator.next_cursor,
+            'previous_cursor': paginator.previous_cursor,
+        }
+    else:
+        navigation = {
+            'page': page_obj.number,
+            'num_pages': paginator.num_pages,
+        }
+    return JsonResponse({
+        **extra,
+        'results': [post_to_dict(post) for post in page_obj],
+        **navigation,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@require_safe
+@condition(etag_func=feed_etag)
+@query_budget(2)
+def index(request):
+    return page_response(request, Post.objects.feed())
+
+
+@require_safe
+@condition(etag_func=feed_etag)
+@query_budget(3)
+def group_list(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return page_response(
+        request, group.posts.feed(),
+        group={
+            'slug': group.slug,
+            'title': group.title,
+            'description': group.description,
+        },
+    )
+
+
+@require_safe
+@condition(etag_func=feed_etag)
+@query_budget(4)
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return page_response(
+        request, author.posts.feed(),
+        author={
+            'username': author.username,
+            'posts_count': stats_for(author).posts_count,
+        },
+    )
+
+
+@require_safe
+@condition(etag_func=follow_etag)
+@query_budget(3)
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'detail': 'Требуется авторизация.'}, status=401
+        )
+    return page_json(
+        timeline_page(request, request.user, POSTS_PER_PAGE)
+    )
+
+
+@require_safe
+@condition(etag_func=post_etag)
+@query_budget(2)
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.feed(), pk=post_id)
+    return JsonResponse({
+        **post_to_dict(post),
+        'comments_count': post.comments_count,
+    }, json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,52 @@
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import search, timeline
+from .counters import reconcile
+
+BATCH_SIZE = 500
+
+
+@contextmanager
+def explicit_dates(*models):
+    """Сохранять ``created`` и ``updated`` как есть, без auto_now."""
+    fields = [
+        field for model in models for field in model._meta.fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def batched(iterable, size):
+    """Списки по ``size`` элементов из итератора, последний — короче."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def refresh_derived(reindex=True):
+    """Пересчитать то, что при обычной записи обновляют сигналы.
+
+    ``bulk_create`` сигналов не посылает: после загрузки сверяются
+    счётчики, заново собираются ленты подписок и, если ``reindex``,
+    поисковый индекс, а кэш лент сбрасывается после коммита.
+    """
+    reconcile()
+    timeline.rebuild()
+    if reindex:
+        search.reindex()
+    transaction.on_commit(cache.clear)
@@ -0,0 +1,41 @@
+from django.core.cache import cache
+
+from core.metrics import count_cache
+
+from .paginators import CursorPaginator
+
+COMMENTS_PER_PAGE = 20
+FIRST_PAGE_TIMEOUT = 300
+
+
+def first_page_key(post_id):
+    return f'posts:comments:{post_id}:first'
+
+
+def comments_page(post, cursor=None, per_page=COMMENTS_PER_PAGE):
+    """Комментарии поста от новых к старым и курсор следующей страницы.
+
+    Автор подтягивается тем же запросом, страницы выбираются по курсору
+    без OFFSET.
+    """
+    paginator = CursorPaginator(
+        post.comments.select_related('author'), per_page
+    )
+    page = paginator.get_page(cursor)
+    return list(page), paginator.next_cursor
+
+
+def first_comments_page(post):
+    """Первая страница комментариев из кэша; сбрасывается новым
+    комментарием."""
+    key = first_page_key(post.pk)
+    page = cache.get(key)
+    count_cache('comments', page is not None)
+    if page is None:
+        page = comments_page(post)
+        cache.set(key, page, FIRST_PAGE_TIMEOUT)
+    return page
+
+
+def invalidate_first_page(post_id):
+    cache.delete(first_page_key(post_id))
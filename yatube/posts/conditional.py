@@ -0,0 +1,137 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils.cache import (
+    add_never_cache_headers, patch_cache_control, patch_vary_headers,
+)
+from django.views.decorators.http import condition
+
+from .feed_cache import get_generation, timeline_generation_key
+from .models import Post
+
+# Сколько секунд CDN может отдавать анонимную страницу без перепроверки.
+ANONYMOUS_MAX_AGE = 60
+
+
+def _etag(*parts):
+    return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def feed_etag(request, *args, **kwargs):
+    """ETag страницы ленты без запросов к базе.
+
+    Поколение ленты меняется при создании, правке и удалении любого поста,
+    поэтому одинаковое поколение и адрес дают тот же ответ байт в байт.
+    """
+    return _etag(get_generation(), request.get_full_path())
+
+
+def _viewer(request):
+    """Зритель страницы: от него зависят шапка, кнопки подписки и
+    CSRF-токен в формах."""
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    if not request.user.is_authenticated:
+        return (0, csrf)
+    return (
+        request.user.pk,
+        get_generation(timeline_generation_key(request.user.pk)),
+        csrf,
+    )
+
+
+def page_etag(request, *args, **kwargs):
+    return _etag(feed_etag(request), *_viewer(request))
+
+
+def follow_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    return page_etag(request)
+
+
+def page_last_modified(request, *args, **kwargs):
+    """Last-Modified ленты — время её поколения.
+
+    MAX(updated) не меняется, когда пост удалён или ушёл из группы или
+    профиля, а поколение меняется при любом изменении постов. Для
+    пользователя учитывается и поколение его подписок.
+    """
+    generation = get_generation()
+    if request.user.is_authenticated:
+        generation = max(generation, get_generation(
+            timeline_generation_key(request.user.pk)
+        ))
+    return datetime.fromtimestamp(generation / 1e9, tz=timezone.utc)
+
+
+def post_version(request, post_id):
+    """Правка поста, число и время последнего комментария, счётчик постов
+    автора — одним запросом на ETag.
+
+    Last-Modified у поста нет: удалённый комментарий не сдвигает ни одну
+    дату, и клиент с одним If-Modified-Since получил бы ложный 304.
+    """
+    if not hasattr(request, '_post_version'):
+        request._post_version = Post.objects.filter(pk=post_id).order_by(
+        ).annotate(last_comment=Max('comments__created')).values_list(
+            'updated', 'comments_count', 'last_comment',
+            'author__stats__posts_count',
+        ).first()
+    return request._post_version
+
+
+def post_etag(request, post_id):
+    version = post_version(request, post_id)
+    return _etag(post_id, *version) if version else None
+
+
+def post_page_etag(request, post_id):
+    version = post_version(request, post_id)
+    if version is None:
+        return None
+    return _etag(
+        post_id, *version, request.get_full_path(), *_viewer(request)
+    )
+
+
+def conditional_page(etag_func, last_modified_func=None):
+    """ETag и Last-Modified для HTML-страницы и заголовки кэша для CDN.
+
+    Ответ 304 отдаётся до запуска view и шаблонов. Анонимные страницы
+    можно кэшировать на CDN ``ANONYMOUS_MAX_AGE`` секунд, страницы
+    пользователя — только в браузере и с перепроверкой. Устаревшая копия
+    из ``feed_cache`` уходит без валидаторов и не кэшируется.
+    """
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag_func, last_modified_func=last_modified_func
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                return response
+            if getattr(response, 'feed_stale', False):
+                # Пока страницу пересобирают, отдаётся копия прошлого
+                # поколения: с валидаторами текущего клиент и CDN хранили
+                # бы её до следующего изменения постов.
+                del response['ETag']
+                del response['Last-Modified']
+                add_never_cache_headers(response)
+            elif request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(
+                    response, public=True, max_age=0,
+                    s_maxage=ANONYMOUS_MAX_AGE,
+                )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+
+        return wrapper
+
+    return decorator
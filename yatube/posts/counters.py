@@ -0,0 +1,74 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def stats_for(user):
+    """Счётчики пользователя; без строки в таблице все они равны нулю."""
+    return UserStats.objects.filter(user=user).first() or UserStats(user=user)
+
+
+def change_user_stat(user_id, field, delta):
+    """Атомарно изменить счётчик пользователя на ``delta``."""
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    if stats.update(**{field: F(field) + delta}) or delta < 0:
+        return
+    _, created = UserStats.objects.get_or_create(
+        user_id=user_id, defaults={field: delta}
+    )
+    if not created:
+        stats.update(**{field: F(field) + delta})
+
+
+def change_comments_count(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def _reconcile(queryset, field, actual):
+    drifted = queryset.annotate(actual=actual).exclude(**{field: F('actual')})
+    fixed = list(drifted.values_list('pk', 'actual'))
+    for pk, value in fixed:
+        queryset.filter(pk=pk).update(**{field: value})
+    return len(fixed)
+
+
+def reconcile():
+    """Пересчитать счётчики по данным; вернуть число исправленных строк."""
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True
+    )
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk) for pk in missing),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    return {
+        'posts_count': _reconcile(
+            UserStats.objects.all(), 'posts_count', _count(Post, 'author')
+        ),
+        'followers_count': _reconcile(
+            UserStats.objects.all(), 'followers_count',
+            _count(Follow, 'author'),
+        ),
+        'following_count': _reconcile(
+            UserStats.objects.all(), 'following_count',
+            _count(Follow, 'user'),
+        ),
+        'comments_count': _reconcile(
+            Post.objects.all(), 'comments_count', _count(Comment, 'post')
+        ),
+    }
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import zipfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from core.tasks import task
+from .models import Post, User
+
+CHUNK_SIZE = 500
+COPY_BLOCK = 64 * 1024
+PENDING_TIMEOUT = 3600
+
+
+class _Pipe:
+    """Файл только для записи: ``ZipFile`` пишет, генератор забирает.
+
+    Без ``seek`` и ``tell`` zipfile сам переходит в потоковый режим и
+    пишет размеры и CRC после данных каждого файла.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _post_to_dict(post):
+    pk, text, created, updated, group, image, comments_count = post
+    return {
+        'id': pk,
+        'text': text,
+        'created': created.isoformat(),
+        'updated': updated.isoformat(),
+        'group': group,
+        'image': f'images/{image}' if image else None,
+        'comments_count': comments_count,
+    }
+
+
+def export_chunks(user, chunk_size=CHUNK_SIZE):
+    """ZIP с постами автора в ``posts.json`` и оригиналами картинок.
+
+    Архив отдаётся кусками по мере записи: в памяти одновременно не
+    больше ``chunk_size`` постов и одного блока картинки.
+    """
+    pipe = _Pipe()
+    archive = zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED)
+    posts = user.posts.order_by('pk').values_list(
+        'pk', 'text', 'created', 'updated', 'group__slug', 'image',
+        'comments_count',
+    )
+    with archive.open('posts.json', 'w', force_zip64=True) as entry:
+        entry.write(b'[')
+        for index, post in enumerate(posts.iterator(chunk_size)):
+            if index:
+                entry.write(b',')
+            entry.write(json.dumps(
+                _post_to_dict(post), ensure_ascii=False
+            ).encode())
+            if index % chunk_size == 0:
+                yield pipe.take()
+        entry.write(b']')
+    yield pipe.take()
+
+    storage = Post._meta.get_field('image').storage
+    images = user.posts.exclude(image='').order_by().values_list(
+        'image', flat=True
+    ).distinct()
+    for name in images.iterator(chunk_size):
+        if not storage.exists(name):
+            continue
+        # Картинки уже сжаты: повторное сжатие только тратит процессор.
+        info = zipfile.ZipInfo(f'images/{name}')
+        info.compress_type = zipfile.ZIP_STORED
+        info.file_size = storage.size(name)
+        with storage.open(name) as source, archive.open(info, 'w') as entry:
+            for block in iter(lambda: source.read(COPY_BLOCK), b''):
+                entry.write(block)
+                yield pipe.take()
+    archive.close()
+    yield pipe.take()
+
+
+def export_version(user):
+    """Версия данных автора: меняется с каждым новым, правленым или
+    удалённым постом."""
+    stats = user.posts.aggregate(count=Count('pk'), updated=Max('updated'))
+    key = f'{stats["count"]}:{stats["updated"]}'
+    return hashlib.md5(key.encode()).hexdigest()[:16]
+
+
+def export_path(user, version):
+    return os.path.join(settings.EXPORT_ROOT, f'{user.pk}-{version}.zip')
+
+
+def ready_export(user):
+    """Путь к собранному архиву с актуальными данными или ``None``."""
+    path = export_path(user, export_version(user))
+    return path if os.path.exists(path) else None
+
+
+def pending_key(user):
+    return f'posts:export:pending:{user.pk}'
+
+
+def build_export(user_id):
+    """Записать архив автора в ``EXPORT_ROOT`` и удалить старые версии."""
+    user = User.objects.get(pk=user_id)
+    version = export_version(user)
+    path = export_path(user, version)
+    os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+    temporary = f'{path}.part'
+    try:
+        with open(temporary, 'wb') as output:
+            for chunk in export_chunks(user):
+                output.write(chunk)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        cache.delete(pending_key(user))
+    prefix = f'{user.pk}-'
+    for name in os.listdir(settings.EXPORT_ROOT):
+        if name.startswith(prefix) and name != os.path.basename(path):
+            os.remove(os.path.join(settings.EXPORT_ROOT, name))
+    return path
+
+
+@task(max_attempts=3, timeout=3600)
+def build_export_task(user_id):
+    build_export(user_id)
+
+
+def schedule_export(user):
+    """Поставить сборку архива в очередь, если она ещё не стоит там."""
+    if cache.add(pending_key(user), True, PENDING_TIMEOUT):
+        build_export_task.delay(user.pk)
@@ -0,0 +1,102 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+
+from core.metrics import count_cache
+from core.routers import replica_synced_at
+
+GENERATION_KEY = 'posts:feed:generation'
+# Страница считается свежей FEED_CACHE_TIMEOUT секунд после сборки, но
+# хранится дольше: устаревшую копию отдают, пока один воркер её пересобирает.
+FEED_CACHE_TIMEOUT = 300
+STALE_TIMEOUT = 60
+LOCK_TIMEOUT = 10
+
+
+def new_generation():
+    """Поколение — время изменения в наносекундах.
+
+    Счётчик после сброса кэша начался бы заново, и ETag прошлых поколений
+    снова совпали бы с новыми. Время после сброса всегда новое.
+    """
+    return time.time_ns()
+
+
+def get_generation(key=GENERATION_KEY):
+    """Поколение данных, которые видит текущий запрос.
+
+    Реплика, скопированная раньше последнего изменения, видит данные на
+    момент копирования, и её поколение — время этого копирования. Иначе
+    отстающая реплика положила бы в кэш лент старую страницу под новым
+    поколением и отдала бы с ней новый ETag.
+    """
+    generation = cache.get_or_set(key, new_generation, None)
+    synced = replica_synced_at()
+    if synced is not None and synced < generation:
+        return synced
+    return generation
+
+
+def bump_generation(key=GENERATION_KEY):
+    """Сбросить все закэшированные страницы ленты."""
+    cache.set(key, new_generation(), None)
+
+
+def timeline_generation_key(user_id):
+    """Поколение ленты подписок: меняется при подписке и отписке."""
+    return f'posts:timeline:{user_id}:generation'
+
+
+def feed_cache_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'posts:feed:{request.user.pk or 0}:{path}'
+
+
+def feed_cache(view):
+    """Кэш страниц ленты, сбрасываемый номером поколения.
+
+    Пересобирает страницу только воркер, взявший блокировку через
+    ``cache.add``; остальные в это время получают прежнюю копию с
+    атрибутом ``feed_stale``.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return view(request, *args, **kwargs)
+
+        key = feed_cache_key(request)
+        generation = get_generation()
+        entry = cache.get(key)
+        if entry is not None:
+            entry_generation, expires, response = entry
+            if entry_generation == generation and expires > time.time():
+                count_cache('feed', True)
+                return response
+
+        lock_key = key + ':lock'
+        if not cache.add(lock_key, True, LOCK_TIMEOUT):
+            if entry is not None:
+                count_cache('feed', True)
+                response = entry[2]
+                # Страница прошлого поколения: ETag и Last-Modified
+                # текущего к ней не подходят, см. conditional_page.
+                response.feed_stale = entry[0] != generation
+                return response
+            count_cache('feed', False)
+            return view(request, *args, **kwargs)
+        count_cache('feed', False)
+        try:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(
+                    key,
+                    (generation, time.time() + FEED_CACHE_TIMEOUT, response),
+                    FEED_CACHE_TIMEOUT + STALE_TIMEOUT,
+                )
+        finally:
+            cache.delete(lock_key)
+        return response
+
+    return wrapper
@@ -1,6 +1,24 @@
 from django.utils.translation import gettext_lazy as _
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from .models import Post, Comment
+from .uploads import check_image_limits, check_upload_size
+
+
+def limited_image(to_python):
+    """``ImageField.to_python`` с лимитами размера, разрешения и кадров.
+
+    Размер проверяется до Pillow: ``BoundedUploadHandler`` обрезает
+    большой файл, и обрезанный PNG или JPEG выглядел бы битым.
+    """
+    def wrapper(data):
+        if isinstance(data, UploadedFile):
+            check_upload_size(data)
+        image = to_python(data)
+        if isinstance(image, UploadedFile):
+            check_image_limits(image)
+        return image
+    return wrapper
 
 
 class PostForm(forms.ModelForm):
@@ -13,6 +31,12 @@ class PostForm(forms.ModelForm):
             'image': _('Прикрепить фото')
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Поле остаётся обычным ImageField, меняется только разбор файла.
+        image = self.fields['image']
+        image.to_python = limited_image(image.to_python)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,174 @@
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections
+
+from core.decorators import write_transaction
+from posts.models import Comment, Post, User
+
+# Профиль «default» — настройки Django по умолчанию: журнал отката,
+# новое соединение на запрос и транзакция на каждый оператор.
+PROFILES = ('default', 'tuned')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность конкурентной записи в SQLite '
+        'с настройками по умолчанию и с профилем из settings.DATABASES: '
+        'WAL, BEGIN IMMEDIATE и единый путь записи. Каждый профиль '
+        'работает со своей временной базой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=100)
+        parser.add_argument('--readers', type=int, default=2)
+        parser.add_argument('--output', help='Файл для JSON с результатом.')
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер рассчитан только на SQLite.')
+
+        original = dict(connection.settings_dict)
+        results = {}
+        try:
+            for profile in PROFILES:
+                with tempfile.TemporaryDirectory() as directory:
+                    self.use_database(
+                        original, profile, os.path.join(directory, 'db')
+                    )
+                    results[profile] = self.run(profile, options)
+                    connections.close_all()
+        finally:
+            connections.close_all()
+            connection.settings_dict.clear()
+            connection.settings_dict.update(original)
+
+        gain = results['tuned']['writes_per_second'] / max(
+            results['default']['writes_per_second'], 1e-9
+        )
+        self.stdout.write(f'Прирост пропускной способности: {gain:.1f}x')
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(
+                    {'options': {
+                        key: options[key]
+                        for key in ('threads', 'writes', 'readers')
+                    }, 'results': results, 'gain': round(gain, 2)},
+                    output, ensure_ascii=False, indent=2,
+                )
+
+    def use_database(self, original, profile, name):
+        """Переключить ``default`` на новую базу, как это делает тест-раннер:
+        словарь настроек общий для соединений всех потоков."""
+        connections.close_all()
+        settings_dict = connections['default'].settings_dict
+        settings_dict.update(original, NAME=name)
+        if profile == 'default':
+            settings_dict.update(CONN_MAX_AGE=0, OPTIONS={})
+        call_command('migrate', verbosity=0, interactive=False)
+
+    def run(self, profile, options):
+        author = User.objects.create_user(username='bench-writer')
+        post = Post.objects.create(author=author, text='bench')
+        writer = write_transaction if profile == 'tuned' else nullcontext
+        latencies, errors = [], []
+        stop = threading.Event()
+        readers = [
+            threading.Thread(target=self.read, args=(post, stop))
+            for _ in range(options['readers'])
+        ]
+        writers = [
+            threading.Thread(target=self.write, args=(
+                writer, post, author, options['writes'], latencies, errors
+            )) for _ in range(options['threads'])
+        ]
+        for thread in readers:
+            thread.start()
+        started = time.perf_counter()
+        for thread in writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for thread in readers:
+            thread.join()
+
+        result = self.summary(latencies, errors, elapsed)
+        self.stdout.write(
+            f'{profile}: {result["writes"]} записей за '
+            f'{result["seconds"]:.2f} с ({result["writes_per_second"]}/с), '
+            f'ошибок {result["errors"]}, p50 {result["p50_ms"]} мс, '
+            f'p99 {result["p99_ms"]} мс, journal_mode '
+            f'{result["journal_mode"]}'
+        )
+        if errors:
+            self.stdout.write(f'  например: {errors[0]}')
+        return result
+
+    @staticmethod
+    def write(writer, post, author, count, latencies, errors):
+        """Путь add_comment: прочитать пост и добавить комментарий."""
+        try:
+            for i in range(count):
+                start = time.perf_counter()
+                try:
+                    with writer():
+                        target = Post.objects.get(pk=post.pk)
+                        Comment.objects.create(
+                            post=target, author=author, text=f'bench {i}'
+                        )
+                    latencies.append(time.perf_counter() - start)
+                except OperationalError as error:
+                    errors.append(str(error))
+                # Граница запроса: без CONN_MAX_AGE соединение закроется.
+                close_old_connections()
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def read(post, stop):
+        """Читатели ленты и поста, пока идёт запись."""
+        try:
+            while not stop.is_set():
+                try:
+                    list(Post.objects.feed()[:10])
+                    Comment.objects.filter(post=post).count()
+                except OperationalError:
+                    pass
+                close_old_connections()
+        finally:
+            connections.close_all()
+
+    def summary(self, latencies, errors, elapsed):
+        latencies = sorted(latencies)
+        result = {
+            'journal_mode': self.journal_mode(),
+            'writes': len(latencies),
+            'errors': len(errors),
+            'seconds': round(elapsed, 3),
+            'writes_per_second': round(len(latencies) / elapsed, 1),
+            'p50_ms': None,
+            'p99_ms': None,
+        }
+        if latencies:
+            result['p50_ms'] = round(statistics.median(latencies) * 1000, 2)
+            result['p99_ms'] = round(
+                latencies[max(int(len(latencies) * 0.99), 1) - 1] * 1000, 2
+            )
+        return result
+
+    @staticmethod
+    def journal_mode():
+        with connections['default'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
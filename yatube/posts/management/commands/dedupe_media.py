@@ -0,0 +1,88 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sorl.thumbnail import delete
+
+from posts.feed_cache import bump_generation
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переименовывает картинки постов по хешу содержимого и сводит '
+        'одинаковые файлы в один.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--delete-orphans', action='store_true',
+            help='Удалить файлы, на которые не ссылается ни один пост.',
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        self.dry_run = options['dry_run']
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct().iterator()
+        moved = merged = freed = 0
+        for name in names:
+            if storage.is_hashed(name):
+                continue
+            if not storage.exists(name):
+                self.stderr.write(f'Нет файла {name}')
+                continue
+            with storage.open(name) as content:
+                new_name = storage.hashed_name(name, File(content))
+            if storage.exists(new_name):
+                merged += 1
+                freed += storage.size(name)
+            else:
+                moved += 1
+            if not self.dry_run:
+                self.replace(storage, name, new_name)
+
+        orphans = self.find_orphans(storage)
+        freed += sum(storage.size(name) for name in orphans)
+        if options['delete_orphans'] and not self.dry_run:
+            for name in orphans:
+                storage.delete(name)
+        if (moved or merged) and not self.dry_run:
+            bump_generation()
+        self.stdout.write(
+            f'Переименовано: {moved}, сведено к существующим: {merged}, '
+            f'без ссылок: {len(orphans)}, можно освободить байт: {freed}'
+        )
+
+    def replace(self, storage, name, new_name):
+        """Перенести файл под новое имя и переключить на него посты."""
+        image = Post(image=name).image
+        if storage.exists(new_name):
+            delete(image)
+        else:
+            os.makedirs(
+                os.path.dirname(storage.path(new_name)), exist_ok=True
+            )
+            os.replace(storage.path(name), storage.path(new_name))
+            delete(image, delete_file=False)
+        Post.objects.filter(image=name).update(
+            image=new_name, updated=timezone.now()
+        )
+
+    def find_orphans(self, storage):
+        used = set(
+            Post.objects.exclude(image='').values_list('image', flat=True)
+        )
+        root = storage.path('posts')
+        orphans = []
+        for directory, _, files in os.walk(root):
+            for file_name in files:
+                name = os.path.relpath(
+                    os.path.join(directory, file_name), storage.location
+                ).replace(os.sep, '/')
+                if name not in used:
+                    orphans.append(name)
+        return orphans
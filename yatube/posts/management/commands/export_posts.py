@@ -0,0 +1,128 @@
+import csv
+import json
+import os
+import shutil
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Follow, Group, Post
+
+# Колонки CSV; в NDJSON у записи только заполненные поля.
+FIELDS = (
+    'type', 'id', 'created', 'author', 'user', 'group', 'post', 'title',
+    'text', 'image',
+)
+CHUNK_SIZE = 2000
+
+
+def records(chunk_size=CHUNK_SIZE):
+    """Группы, посты, комментарии и подписки по порядку: комментарий
+    всегда идёт после своего поста."""
+    groups = Group.objects.order_by('pk').values_list(
+        'slug', 'title', 'description'
+    )
+    for slug, title, description in groups.iterator(chunk_size):
+        yield {'type': 'group', 'group': slug, 'title': title,
+               'text': description}
+
+    posts = Post.objects.order_by('pk').values_list(
+        'pk', 'created', 'author__username', 'group__slug', 'text', 'image'
+    )
+    for pk, created, author, group, text, image in posts.iterator(
+        chunk_size
+    ):
+        yield {'type': 'post', 'id': pk, 'created': created.isoformat(),
+               'author': author, 'group': group, 'text': text,
+               'image': image or None}
+
+    comments = Comment.objects.order_by('pk').values_list(
+        'pk', 'created', 'author__username', 'post_id', 'text'
+    )
+    for pk, created, author, post, text in comments.iterator(chunk_size):
+        yield {'type': 'comment', 'id': pk, 'created': created.isoformat(),
+               'author': author, 'post': post, 'text': text}
+
+    follows = Follow.objects.order_by('pk').values_list(
+        'created', 'user__username', 'author__username'
+    )
+    for created, user, author in follows.iterator(chunk_size):
+        yield {'type': 'follow', 'created': created.isoformat(),
+               'user': user, 'author': author}
+
+
+def file_format(path, format_):
+    if format_:
+        return format_
+    return 'csv' if path.endswith('.csv') else 'ndjson'
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, посты, комментарии и подписки в NDJSON или CSV '
+        'потоком, без загрузки таблиц в память. Картинки копируются '
+        'отдельным шагом с --images.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки или - для stdout.')
+        parser.add_argument('--format', choices=('ndjson', 'csv'))
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            '--images', metavar='DIR',
+            help='Скопировать картинки постов в этот каталог.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format_ = file_format(path, options['format'])
+        output = (
+            sys.stdout if path == '-'
+            else open(path, 'w', encoding='utf-8', newline='')
+        )
+        try:
+            count = self.write(
+                output, format_, records(options['chunk_size'])
+            )
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write(f'Выгружено записей: {count}')
+        if options['images']:
+            copied = self.copy_images(options['images'])
+            self.stderr.write(f'Скопировано картинок: {copied}')
+
+    @staticmethod
+    def write(output, format_, rows):
+        count = 0
+        if format_ == 'csv':
+            writer = csv.DictWriter(output, FIELDS)
+            writer.writeheader()
+            for count, row in enumerate(rows, 1):
+                writer.writerow(row)
+            return count
+        for count, row in enumerate(rows, 1):
+            output.write(json.dumps(
+                {key: value for key, value in row.items()
+                 if value is not None},
+                ensure_ascii=False,
+            ))
+            output.write('\n')
+        return count
+
+    @staticmethod
+    def copy_images(directory):
+        """Скопировать файлы картинок с теми же относительными именами."""
+        storage = Post._meta.get_field('image').storage
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        copied = 0
+        for name in names.iterator():
+            target = os.path.join(directory, name)
+            if os.path.exists(target) or not storage.exists(name):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(storage.path(name), target)
+            copied += 1
+        return copied
@@ -0,0 +1,114 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.models import Comment, Follow, Group, Post, User
+
+FEED_INDEXES = (
+    (Post, 'post_created_id_idx'),
+    (Post, 'post_author_created_idx'),
+    (Post, 'post_group_created_idx'),
+    (Comment, 'comment_post_created_idx'),
+)
+PAGE_SIZE = 11
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы и время запросов лент с составными индексами '
+        'и без них. Данные и удаление индексов откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with connection.constraint_checks_disabled(), transaction.atomic():
+            self.seed(options)
+            self.report('С индексами', options['repeat'])
+            with connection.schema_editor() as schema_editor:
+                for model, name in FEED_INDEXES:
+                    index = next(
+                        index for index in model._meta.indexes
+                        if index.name == name
+                    )
+                    schema_editor.remove_index(model, index)
+            self.report('Без индексов', options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        prefix = f'bench-{int(time.time())}'
+        User.objects.bulk_create(
+            User(username=f'{prefix}-{i}') for i in range(options['users'])
+        )
+        users = list(User.objects.filter(username__startswith=prefix))
+        Group.objects.bulk_create(
+            Group(title=f'{prefix}-{i}', slug=f'{prefix}-{i}', description='')
+            for i in range(options['groups'])
+        )
+        groups = list(Group.objects.filter(slug__startswith=prefix))
+        Post.objects.bulk_create(
+            (
+                Post(
+                    text=f'bench post {i}',
+                    author=random.choice(users),
+                    group=random.choice(groups + [None]),
+                ) for i in range(options['posts'])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        post_ids = list(Post.objects.values_list('id', flat=True))
+        Comment.objects.bulk_create(
+            (
+                Comment(
+                    text='bench comment',
+                    author=random.choice(users),
+                    post_id=random.choice(post_ids),
+                ) for _ in range(options['posts'])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        Follow.objects.bulk_create(
+            (
+                Follow(user=user, author=author)
+                for user in users for author in random.sample(users, 10)
+                if user != author
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        self.user, self.group = users[0], groups[0]
+        self.post = Post.objects.filter(comments__isnull=False).first()
+
+    def queries(self):
+        feed = Post.objects.feed().order_by('-created', '-id')
+        middle = feed[feed.count() // 2]
+        return {
+            'index': feed[:PAGE_SIZE],
+            'index, глубокая страница': feed.filter(
+                created__lt=middle.created
+            )[:PAGE_SIZE],
+            'group_list': feed.filter(group=self.group)[:PAGE_SIZE],
+            'profile': feed.filter(author=self.user)[:PAGE_SIZE],
+            'post_detail, комментарии': Comment.objects.filter(
+                post=self.post
+            ),
+            'profile, подписка': Follow.objects.filter(
+                user=self.user, author=self.post.author
+            ),
+        }
+
+    def report(self, title, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, queryset in self.queries().items():
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            elapsed = (time.perf_counter() - started) / repeat * 1000
+            self.stdout.write(f'{name}: {elapsed:.2f} мс')
+            self.stdout.write(queryset.explain())
@@ -0,0 +1,305 @@
+import csv
+import json
+import os
+import shutil
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.bulk import batched, explicit_dates, refresh_derived
+from posts.models import Comment, Follow, Group, Post, User
+from posts.search import index_comments, index_posts
+from .export_posts import file_format
+
+
+def read_records(path, format_):
+    """Записи выгрузки по одной; пустые поля CSV превращаются в ``None``."""
+    with open(path, encoding='utf-8', newline='') as source:
+        if format_ == 'csv':
+            for row in csv.DictReader(source):
+                yield {key: value or None for key, value in row.items()}
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def max_ids(rows):
+    """Наибольшие id постов и комментариев в выгрузке."""
+    top = {'post': 0, 'comment': 0}
+    for row in rows:
+        if row['type'] in top:
+            top[row['type']] = max(top[row['type']], int(row['id']))
+    return top
+
+
+# Сдвиг счётчика автоинкремента на ``count`` id: запросы с именами своих
+# параметров; последний возвращает новое значение счётчика.
+RESERVE_SQL = {
+    'sqlite': (
+        (
+            'INSERT INTO sqlite_sequence (name, seq) SELECT %s, 0 '
+            'WHERE NOT EXISTS '
+            '(SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+            ('name', 'name'),
+        ),
+        (
+            'UPDATE sqlite_sequence SET seq = MAX(seq, '
+            '(SELECT COALESCE(MAX(id), 0) FROM {table})) + %s '
+            'WHERE name = %s',
+            ('count', 'name'),
+        ),
+        ('SELECT seq FROM sqlite_sequence WHERE name = %s', ('name',)),
+    ),
+    # Блокировка таблицы не даёт вставить строку между nextval и setval.
+    'postgresql': (
+        ('LOCK TABLE {table} IN EXCLUSIVE MODE', ()),
+        (
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST("
+            "nextval(pg_get_serial_sequence(%s, 'id')), "
+            '(SELECT COALESCE(MAX(id), 0) FROM {table})) + %s)',
+            ('name', 'name', 'count'),
+        ),
+    ),
+}
+
+
+def reserve_ids(model, count):
+    """Занять ``count`` id в счётчике автоинкремента ``model``.
+
+    Возвращает сдвиг: id от ``сдвиг + 1`` до ``сдвиг + count`` уже не
+    достанутся новым записям сайта.
+    """
+    statements = RESERVE_SQL.get(connection.vendor)
+    if statements is None:
+        raise CommandError(
+            f'Загрузка не поддерживает базу {connection.vendor}.'
+        )
+    table = connection.ops.quote_name(model._meta.db_table)
+    values = {'name': model._meta.db_table, 'count': count}
+    with transaction.atomic(), connection.cursor() as cursor:
+        for sql, names in statements:
+            cursor.execute(
+                sql.format(table=table), [values[name] for name in names]
+            )
+        return cursor.fetchone()[0] - count
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку export_posts пачками через bulk_create. '
+        'Прогресс пишется в файл состояния после каждой пачки, поэтому '
+        'прерванную загрузку можно продолжить тем же вызовом. Картинки '
+        'копируются отдельным шагом с --images.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('ndjson', 'csv'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--state', help='Файл состояния; по умолчанию PATH.state.'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать заново, не глядя на файл состояния.',
+        )
+        parser.add_argument(
+            '--images', metavar='DIR',
+            help='Каталог с картинками, выгруженными export_posts --images.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.state_path = options['state'] or f'{path}.state'
+        state = self.load_state(path, options)
+        if state.get('done'):
+            self.stdout.write(
+                'Выгрузка уже загружена; --restart загрузит её ещё раз.'
+            )
+        else:
+            self.import_rows(path, options, state)
+        if options['images']:
+            copied = self.copy_images(options['images'])
+            self.stdout.write(f'Скопировано картинок: {copied}')
+
+    def load_state(self, path, options):
+        if not options['restart'] and os.path.exists(self.state_path):
+            with open(self.state_path) as state_file:
+                return json.load(state_file)
+        # Новые id — старые плюс сдвиг: комментарии находят свой пост
+        # без таблицы соответствия, а повтор пачки ничего не дублирует.
+        # Диапазон занимается в счётчиках заранее, чтобы посты сайта,
+        # созданные во время загрузки, не заняли id из выгрузки.
+        top = max_ids(
+            read_records(path, file_format(path, options['format']))
+        )
+        state = {
+            'records': 0,
+            'post_offset': reserve_ids(Post, top['post']),
+            'comment_offset': reserve_ids(Comment, top['comment']),
+        }
+        self.save_state(state)
+        return state
+
+    def save_state(self, state):
+        temporary = f'{self.state_path}.tmp'
+        with open(temporary, 'w') as state_file:
+            json.dump(state, state_file)
+        os.replace(temporary, self.state_path)
+
+    def import_rows(self, path, options, state):
+        self.state = state
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.password = make_password(None)
+        self.skipped = 0
+
+        rows = read_records(path, file_format(path, options['format']))
+        if state['records']:
+            self.stdout.write(f'Продолжение с записи {state["records"]}')
+        rows = islice(rows, state['records'], None)
+        for batch in batched(rows, options['batch_size']):
+            with transaction.atomic(), explicit_dates(Post, Comment, Follow):
+                self.import_batch(batch)
+            state['records'] += len(batch)
+            self.save_state(state)
+            self.stdout.write(f'Загружено записей: {state["records"]}')
+
+        with transaction.atomic():
+            refresh_derived(reindex=False)
+        state['done'] = True
+        self.save_state(state)
+        self.stdout.write(
+            f'Готово, пропущено записей: {self.skipped}. Миниатюры '
+            f'создаст warm_thumbnails.'
+        )
+
+    def import_batch(self, batch):
+        by_type = {}
+        for row in batch:
+            by_type.setdefault(row['type'], []).append(row)
+        self.ensure_users(
+            name for row in batch
+            for name in (row.get('author'), row.get('user')) if name
+        )
+        self.ensure_groups(by_type.get('group', []), batch)
+
+        post_offset = self.state['post_offset']
+        posts = [self.build_post(row) for row in by_type.get('post', [])]
+        Post.objects.bulk_create(posts, ignore_conflicts=True)
+
+        comments = by_type.get('comment', [])
+        wanted = {int(row['post']) + post_offset for row in comments}
+        existing = set(
+            Post.objects.filter(pk__in=wanted).values_list('pk', flat=True)
+        )
+        # Комментарии к постам, которых нет в выгрузке, пропускаются.
+        kept = [
+            row for row in comments
+            if int(row['post']) + post_offset in existing
+        ]
+        new_comments = [self.build_comment(row) for row in kept]
+        Comment.objects.bulk_create(new_comments, ignore_conflicts=True)
+        self.skipped += len(comments) - len(kept)
+
+        Follow.objects.bulk_create(
+            (
+                Follow(
+                    user_id=self.users[row['user']],
+                    author_id=self.users[row['author']],
+                    created=self.date(row),
+                ) for row in by_type.get('follow', [])
+                if row['user'] != row['author']
+            ),
+            ignore_conflicts=True,
+        )
+        index_posts(post.pk for post in posts)
+        index_comments(comment.pk for comment in new_comments)
+
+    def ensure_users(self, usernames):
+        missing = set(usernames) - self.users.keys()
+        if not missing:
+            return
+        User.objects.bulk_create(
+            (User(username=name, password=self.password) for name in missing),
+            ignore_conflicts=True,
+        )
+        self.users.update(
+            User.objects.filter(username__in=missing).values_list(
+                'username', 'pk'
+            )
+        )
+
+    def ensure_groups(self, group_rows, batch):
+        rows = {row['group']: row for row in group_rows}
+        for row in batch:
+            slug = row.get('group')
+            if row['type'] == 'post' and slug and slug not in rows:
+                rows[slug] = {'group': slug, 'title': slug, 'text': ''}
+        missing = [
+            row for slug, row in rows.items() if slug not in self.groups
+        ]
+        if not missing:
+            return
+        Group.objects.bulk_create(
+            (
+                Group(
+                    slug=row['group'], title=row['title'] or row['group'],
+                    description=row['text'] or '',
+                ) for row in missing
+            ),
+            ignore_conflicts=True,
+        )
+        self.groups.update(
+            Group.objects.filter(
+                slug__in=[row['group'] for row in missing]
+            ).values_list('slug', 'pk')
+        )
+
+    @staticmethod
+    def date(row):
+        return parse_datetime(row.get('created') or '') or timezone.now()
+
+    def build_post(self, row):
+        created = self.date(row)
+        return Post(
+            pk=int(row['id']) + self.state['post_offset'],
+            author_id=self.users[row['author']],
+            group_id=self.groups.get(row.get('group')),
+            text=row.get('text') or '',
+            image=row.get('image') or '',
+            created=created,
+            updated=created,
+        )
+
+    def build_comment(self, row):
+        return Comment(
+            pk=int(row['id']) + self.state['comment_offset'],
+            author_id=self.users[row['author']],
+            post_id=int(row['post']) + self.state['post_offset'],
+            text=row.get('text') or '',
+            created=self.date(row),
+        )
+
+    @staticmethod
+    def copy_images(directory):
+        """Скопировать недостающие картинки постов из ``directory``."""
+        storage = Post._meta.get_field('image').storage
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        copied = 0
+        for name in names.iterator():
+            source = os.path.join(directory, name)
+            if storage.exists(name) or not os.path.exists(source):
+                continue
+            target = storage.path(name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+            copied += 1
+        return copied
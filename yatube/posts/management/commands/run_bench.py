@@ -0,0 +1,190 @@
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Post, User, UserStats
+from posts.paginators import CursorPaginator
+from posts.views import POSTS_PER_PAGE
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, p):
+    """Перцентиль по ближайшему рангу; ``values`` отсортированы."""
+    rank = max(math.ceil(p / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def git_revision():
+    """Коммит и признак незакоммиченных правок или ``(None, None)``."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку и число SQL-запросов горячих страниц: главной, '
+        'глубокой пагинации, профиля, поста и ленты подписок. Результат '
+        'пишется в JSON, чтобы сравнивать прогоны между коммитами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--depth', type=int, default=1000,
+            help='Номер страницы для глубокой пагинации.',
+        )
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Не очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument('--output', help='Файл для JSON с результатом.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения.'
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть больше нуля.')
+        scenarios = self.scenarios(options['depth'])
+        results = {}
+        for name, (url, user) in scenarios.items():
+            results[name] = self.measure(url, user, options)
+            self.report(name, results[name])
+
+        commit, dirty = git_revision()
+        report = {
+            'commit': commit,
+            'dirty': dirty,
+            'date': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'warm_cache': options['warm_cache'],
+            'data': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare']) as previous:
+                self.compare(json.load(previous), report)
+
+    def scenarios(self, depth):
+        """Адреса замеров и пользователь, от имени которого их открывать."""
+        feed = Post.objects.order_by('-created', '-id')
+        post = Post.objects.order_by('-comments_count').first()
+        author = UserStats.objects.order_by('-posts_count').first()
+        reader = UserStats.objects.order_by('-following_count').first()
+        if post is None or author is None or reader is None:
+            raise CommandError(
+                'В базе нет данных: сначала запустите seed_bench.'
+            )
+
+        index = reverse('posts:index')
+        scenarios = {'index': (index, None)}
+        offset = (depth - 1) * POSTS_PER_PAGE
+        last = feed[offset - 1:offset].first() if offset else None
+        if last is not None:
+            cursor = CursorPaginator._make_cursor(last, depth)
+            scenarios['index_deep_cursor'] = (f'{index}?cursor={cursor}', None)
+            scenarios['index_deep_page'] = (f'{index}?page={depth}', None)
+        scenarios.update({
+            'profile': (
+                reverse('posts:profile', args=(author.user.username,)), None
+            ),
+            'post_detail': (
+                reverse('posts:post_detail', args=(post.pk,)), None
+            ),
+            'follow_index': (reverse('posts:follow_index'), reader.user),
+        })
+        return scenarios
+
+    def measure(self, url, user, options):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        latencies, counts, status = [], [], None
+        for i in range(options['warmup'] + options['repeat']):
+            if not options['warm_cache']:
+                cache.clear()
+            queries.clear()
+            with connection.execute_wrapper(count):
+                start = time.perf_counter()
+                response = client.get(url)
+                elapsed = time.perf_counter() - start
+            status = response.status_code
+            if i >= options['warmup']:
+                latencies.append(elapsed * 1000)
+                counts.append(len(queries))
+
+        latencies.sort()
+        result = {'url': url, 'status': status}
+        for p in PERCENTILES:
+            result[f'p{p}_ms'] = round(percentile(latencies, p), 3)
+        result.update({
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'max_ms': round(latencies[-1], 3),
+            'queries': statistics.median_low(counts),
+            'queries_max': max(counts),
+        })
+        return result
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name}: p50 {result["p50_ms"]:.1f} мс, '
+            f'p90 {result["p90_ms"]:.1f} мс, p99 {result["p99_ms"]:.1f} мс, '
+            f'запросов {result["queries"]} (до {result["queries_max"]}), '
+            f'статус {result["status"]}'
+        )
+
+    def compare(self, previous, current):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Сравнение с {previous.get("commit") or "прошлым прогоном"}'
+        ))
+        for name, result in current['results'].items():
+            before = previous.get('results', {}).get(name)
+            if before is None:
+                continue
+            ratio = result['p50_ms'] / before['p50_ms']
+            self.stdout.write(
+                f'{name}: p50 {before["p50_ms"]:.1f} → '
+                f'{result["p50_ms"]:.1f} мс ({ratio:.2f}x), запросов '
+                f'{before["queries"]} → {result["queries"]}'
+            )
@@ -0,0 +1,195 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from posts.bulk import BATCH_SIZE, explicit_dates, refresh_derived
+from posts.models import Comment, Follow, Group, Post, User
+
+WORDS = (
+    'утро вечер город море лес дорога дом кот собака книга музыка кофе '
+    'поезд река друг работа отпуск зима лето осень весна снег дождь '
+    'солнце небо горы фото прогулка ужин завтрак концерт выставка '
+    'python django код база запрос индекс кэш лента подписка'
+).split()
+
+
+def zipf_weights(size, alpha):
+    """Накопленные веса закона Ципфа: ``i``-й элемент весит ``1/i^alpha``."""
+    return list(accumulate(1 / rank ** alpha for rank in range(1, size + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу данными для замеров: пользователи, посты, '
+        'комментарии и граф подписок со степенным распределением. '
+        'После загрузки сверяет счётчики, ленты и поисковый индекс.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=1_000_000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель закона Ципфа для популярности авторов.',
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя.')
+        if User.objects.filter(
+            username__startswith=f'{self.prefix}-'
+        ).exists():
+            raise CommandError(
+                f'Данные с префиксом {self.prefix} уже есть в базе.'
+            )
+
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options['days'])
+        with transaction.atomic(), explicit_dates(Post, Comment, Follow):
+            users = self.seed_users(options['users'])
+            groups = self.seed_groups(options['groups'])
+            # Популярность авторов и активность пишущих не совпадают:
+            # у каждой — своя случайная перестановка пользователей.
+            authors = self.rng.sample(users, len(users))
+            weights = zipf_weights(len(users), options['alpha'])
+            posts = self.seed_posts(
+                options['posts'], authors, weights, groups
+            )
+            self.seed_comments(options['comments'], users, posts)
+            self.seed_follows(
+                users, self.rng.sample(users, len(users)), weights,
+                options['follows'],
+            )
+            self.log('Пересчёт счётчиков, лент и поискового индекса')
+            refresh_derived()
+        self.log('Готово')
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def created_at(self, index, total):
+        """Дата ``index``-го из ``total`` объектов: равномерно по периоду."""
+        return self.start + (self.now - self.start) * (index + 1) / total
+
+    def seed_users(self, count):
+        self.log(f'Пользователи: {count}')
+        password = make_password(None)
+        User.objects.bulk_create(
+            (
+                User(username=f'{self.prefix}-{i}', password=password)
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return list(
+            User.objects.filter(
+                username__startswith=f'{self.prefix}-'
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+
+    def seed_groups(self, count):
+        self.log(f'Группы: {count}')
+        Group.objects.bulk_create(
+            Group(
+                title=f'{self.prefix} {i}',
+                slug=f'{self.prefix}-{i}',
+                description=' '.join(self.rng.choices(WORDS, k=10)),
+            ) for i in range(count)
+        )
+        return list(
+            Group.objects.filter(
+                slug__startswith=f'{self.prefix}-'
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+
+    def text(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def seed_posts(self, count, authors, weights, groups):
+        """Посты идут по возрастанию даты, поэтому и ``id`` растёт с ней."""
+        self.log(f'Посты: {count}')
+        groups = groups + [None] * len(groups)
+
+        def build():
+            for i in range(count):
+                created = self.created_at(i, count)
+                yield Post(
+                    text=self.text(5, 60),
+                    author_id=self.rng.choices(
+                        authors, cum_weights=weights
+                    )[0],
+                    group_id=self.rng.choice(groups) if groups else None,
+                    created=created,
+                    updated=created,
+                )
+
+        first = Post.objects.order_by('-pk').values_list('pk', flat=True)
+        first = (first.first() or 0) + 1
+        Post.objects.bulk_create(build(), batch_size=BATCH_SIZE)
+        return list(
+            Post.objects.filter(pk__gte=first).order_by('pk').values_list(
+                'pk', flat=True
+            )
+        )
+
+    def seed_comments(self, count, users, posts):
+        self.log(f'Комментарии: {count}')
+        if not posts:
+            return
+        # Обсуждают в основном немногие посты: у них свой закон Ципфа.
+        popular = self.rng.sample(range(len(posts)), len(posts))
+        weights = zipf_weights(len(popular), 1.0)
+
+        def build():
+            for _ in range(count):
+                index = self.rng.choices(popular, cum_weights=weights)[0]
+                created = self.created_at(index, len(posts))
+                delay = (self.now - created) * self.rng.random()
+                yield Comment(
+                    text=self.text(3, 30),
+                    author_id=self.rng.choice(users),
+                    post_id=posts[index],
+                    created=created + delay,
+                )
+
+        Comment.objects.bulk_create(build(), batch_size=BATCH_SIZE)
+
+    def seed_follows(self, users, authors, weights, mean):
+        """Число подписок и популярность авторов — степенные законы."""
+        self.log(f'Подписки: в среднем {mean} на пользователя')
+        shape = 2.0
+        scale = mean * (shape - 1) / shape
+
+        def build():
+            for user in users:
+                size = min(
+                    int(scale * self.rng.paretovariate(shape)),
+                    len(users) - 1,
+                )
+                chosen = set(
+                    self.rng.choices(authors, cum_weights=weights, k=size)
+                )
+                chosen.discard(user)
+                for author in chosen:
+                    yield Follow(user_id=user, author_id=author,
+                                 created=self.now)
+
+        Follow.objects.bulk_create(
+            build(), batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.feed_cache import bump_generation
+from posts.models import Post
+from posts.thumbnails import (
+    _generate_in_worker, renditions, resolve_renditions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает KV-хранилище sorl: создаёт недостающие миниатюры '
+        'для всех картинок постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct().iterator()
+        checked = generated = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(islice(names, options['batch_size']))
+                if not batch:
+                    break
+                missing = self.find_missing(batch)
+                done = [
+                    name for name, ok in zip(missing, pool.map(
+                        lambda name: _generate_in_worker(name, False),
+                        missing,
+                    )) if ok
+                ]
+                Post.objects.filter(image__in=done).update(
+                    updated=timezone.now()
+                )
+                checked += len(batch)
+                generated += len(done)
+                self.stdout.write(
+                    f'Проверено картинок: {checked}, создано: {generated}'
+                )
+        if generated:
+            bump_generation()
+
+    def find_missing(self, names):
+        images = [Post(image=name).image for name in names]
+        resolved = resolve_renditions(
+            images, list(renditions()), schedule=False
+        )
+        return sorted({
+            name for (name, _), thumbnail in resolved.items()
+            if thumbnail is None
+        })
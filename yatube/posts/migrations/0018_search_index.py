@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import migrations
+
+SQLITE_INDEX = (
+    "CREATE VIRTUAL TABLE posts_search USING fts5("
+    "text, comments, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO posts_search (rowid, text, comments) "
+    "SELECT p.id, p.text, COALESCE(("
+    "  SELECT group_concat(c.text, ' ') FROM posts_comment c"
+    "  WHERE c.post_id = p.id"
+    "), '') FROM posts_post p",
+)
+
+POSTGRESQL_INDEX = (
+    "CREATE TABLE posts_search ("
+    "post_id integer PRIMARY KEY "
+    "REFERENCES posts_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,"
+    "document tsvector NOT NULL)",
+    "CREATE INDEX posts_search_document_idx ON posts_search "
+    "USING GIN (document)",
+    "INSERT INTO posts_search (post_id, document) "
+    "SELECT p.id, "
+    "setweight(to_tsvector(%(config)s::regconfig, COALESCE(p.text, '')), 'A') || "
+    "setweight(to_tsvector(%(config)s::regconfig, COALESCE(("
+    "  SELECT string_agg(c.text, ' ') FROM posts_comment c"
+    "  WHERE c.post_id = p.id"
+    "), '')), 'B') FROM posts_post p",
+)
+
+
+def create_index(apps, schema_editor):
+    statements = {
+        'sqlite': SQLITE_INDEX,
+        'postgresql': POSTGRESQL_INDEX,
+    }.get(schema_editor.connection.vendor, ())
+    params = {'config': settings.SEARCH_CONFIG}
+    with schema_editor.connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql, params if '%(' in sql else None)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
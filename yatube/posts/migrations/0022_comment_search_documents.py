@@ -0,0 +1,67 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations
+
+SQLITE_INDEX = (
+    "DROP TABLE posts_search",
+    "CREATE VIRTUAL TABLE posts_search USING fts5("
+    "text, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO posts_search (rowid, text) SELECT id, text FROM posts_post",
+    "CREATE VIRTUAL TABLE posts_comment_search USING fts5("
+    "text, post_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO posts_comment_search (rowid, text, post_id) "
+    "SELECT id, text, post_id FROM posts_comment",
+)
+
+POSTGRESQL_INDEX = (
+    "UPDATE posts_search s "
+    "SET document = setweight("
+    "to_tsvector(%(config)s::regconfig, COALESCE(p.text, '')), 'A') "
+    "FROM posts_post p WHERE p.id = s.post_id",
+    "CREATE TABLE posts_comment_search ("
+    "comment_id integer PRIMARY KEY "
+    "REFERENCES posts_comment (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,"
+    "post_id integer NOT NULL "
+    "REFERENCES posts_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,"
+    "document tsvector NOT NULL)",
+    "CREATE INDEX posts_comment_search_document_idx "
+    "ON posts_comment_search USING GIN (document)",
+    "CREATE INDEX posts_comment_search_post_idx "
+    "ON posts_comment_search (post_id)",
+    "INSERT INTO posts_comment_search (comment_id, post_id, document) "
+    "SELECT id, post_id, "
+    "setweight(to_tsvector(%(config)s::regconfig, COALESCE(text, '')), 'B') "
+    "FROM posts_comment",
+)
+
+
+def split_index(apps, schema_editor):
+    statements = {
+        'sqlite': SQLITE_INDEX,
+        'postgresql': POSTGRESQL_INDEX,
+    }.get(schema_editor.connection.vendor, ())
+    params = {'config': settings.SEARCH_CONFIG}
+    with schema_editor.connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql, params if '%(' in sql else None)
+
+
+def merge_index(apps, schema_editor):
+    if schema_editor.connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_comment_search')
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+    previous = import_module('posts.migrations.0018_search_index')
+    previous.create_index(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_timeline_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_index, merge_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:42
+
+from django.db import migrations, models
+
+CELEBRITY_FOLLOWERS = 1000
+
+
+def mark_celebrities(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers_count__gte=CELEBRITY_FOLLOWERS
+    ).update(celebrity=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_comment_search_documents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='celebrity',
+            field=models.BooleanField(default=False, help_text='Посты не раскладываются по лентам, а читаются по запросу', verbose_name='Знаменитость'),
+        ),
+        migrations.RunPython(mark_celebrities, migrations.RunPython.noop),
+    ]
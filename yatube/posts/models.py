@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from core.models import CreatedModel
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -14,6 +16,12 @@ class Group(CreatedModel):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Посты для лент: автор и группа подтягиваются одним запросом."""
+        return self.select_related('author', 'group')
+
+
 class Post(CreatedModel):
     text = models.TextField("Текст поста", null=True)
     author = models.ForeignKey(
@@ -35,14 +43,57 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
 
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
+
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        """Правка поста не пишет ``comments_count``: его меняют только
+        сигналы комментариев через F(), а значение в памяти могло
+        устареть с момента чтения поста."""
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'comments_count'
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('-created', '-id'), name='post_created_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-created', '-id'),
+                name='post_author_created_idx',
+            ),
+            models.Index(
+                fields=('group', '-created', '-id'),
+                name='post_group_created_idx',
+            ),
+            # MAX(updated) для Last-Modified лент читается из индекса.
+            models.Index(fields=('updated',), name='post_updated_idx'),
+            models.Index(
+                fields=('author', 'updated'), name='post_author_updated_idx'
+            ),
+            models.Index(
+                fields=('group', 'updated'), name='post_group_updated_idx'
+            ),
+        )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -71,6 +122,12 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_idx',
+            ),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -91,4 +148,72 @@ class Follow(CreatedModel):
 
     class Meta:
         ordering = ('-created',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_follow'
+            ),
+        )
         verbose_name = 'Подписки'
+
+
+class TimelineEntry(models.Model):
+    """Готовая лента подписок: запись на каждый пост для каждого читателя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name="читатель",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="автор",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name="пост",
+    )
+    created = models.DateTimeField("Дата публикации поста")
+
+    class Meta:
+        ordering = ('-created',)
+        unique_together = ('user', 'post')
+        indexes = (
+            models.Index(
+                fields=('user', '-created', '-post'),
+                name='timeline_user_created_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'), name='timeline_user_author_idx'
+            ),
+        )
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Ленты подписок'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя, обновляются сигналами."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name="пользователь",
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+    celebrity = models.BooleanField(
+        'Знаменитость',
+        default=False,
+        help_text='Посты не раскладываются по лентам, а читаются по запросу',
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
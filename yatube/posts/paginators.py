@@ -0,0 +1,131 @@
+import hashlib
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'posts.cursor'
+COUNT_CACHE_TIMEOUT = 60
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация ленты по паре (created, id).
+
+    Страница выбирается условием ``(created, id) < (курсор)`` без OFFSET,
+    поэтому глубокие страницы стоят столько же, сколько первая. Общее
+    число записей берётся из кэша и не пересчитывается на каждый запрос.
+    """
+    keyset = True
+
+    def __init__(self, object_list, per_page):
+        super().__init__(object_list, per_page)
+        self.number = 1
+        self.has_next = False
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    @cached_property
+    def count(self):
+        """Приблизительное число записей: COUNT(*) не чаще раза в минуту."""
+        query = str(self.object_list.query).encode()
+        key = 'posts:count:' + hashlib.md5(query).hexdigest()
+        return cache.get_or_set(
+            key, self.object_list.count, COUNT_CACHE_TIMEOUT
+        )
+
+    @property
+    def num_pages(self):
+        return self.number + 1 if self.has_next else self.number
+
+    def get_page(self, cursor):
+        """Вернуть страницу по курсору; битый курсор ведёт на первую."""
+        try:
+            position = signing.loads(cursor, salt=CURSOR_SALT)
+            created = parse_datetime(position['created'])
+        except (TypeError, KeyError, signing.BadSignature):
+            position, created = None, None
+        if created is None:
+            return self._first_page()
+        return self._page_from(position, created)
+
+    def _first_page(self):
+        posts = self._slice(None, backward=False)
+        self.has_next = len(posts) > self.per_page
+        return self._build_page(posts[:self.per_page], 1, False)
+
+    def _page_from(self, position, created):
+        after = (created, position['id'])
+        if position.get('backward'):
+            posts = self._slice(after, backward=True)
+            has_previous = len(posts) > self.per_page
+            posts = posts[:self.per_page][::-1]
+            self.has_next = True
+        else:
+            posts = self._slice(after, backward=False)
+            has_previous = True
+            self.has_next = len(posts) > self.per_page
+            posts = posts[:self.per_page]
+        number = max(position.get('number', 2), 2) if has_previous else 1
+        return self._build_page(posts, number, has_previous)
+
+    def _slice(self, after, backward):
+        """``per_page + 1`` записей за курсором в порядке обхода."""
+        return list(
+            keyset(self.object_list, after, backward)[:self.per_page + 1]
+        )
+
+    def _build_page(self, posts, number, has_previous):
+        self.number = number
+        if posts and self.has_next:
+            self.next_cursor = self._make_cursor(posts[-1], number + 1)
+        if posts and has_previous:
+            self.previous_cursor = self._make_cursor(
+                posts[0], number - 1, backward=True
+            )
+        return Page(posts, number, self)
+
+    @staticmethod
+    def _make_cursor(post, number, backward=False):
+        return signing.dumps(
+            {
+                'created': post.created.isoformat(),
+                'id': post.id,
+                'number': number,
+                'backward': backward,
+            },
+            salt=CURSOR_SALT,
+            compress=True,
+        )
+
+
+def keyset(queryset, after, backward=False, pk='id'):
+    """Выборка по ключу (created, ``pk``) строго за ``after``.
+
+    Вперёд — от новых к старым, назад — от старых к новым; порядок
+    совпадает с индексом, поэтому страница читается без сортировки.
+    """
+    if backward:
+        order = ('created', pk)
+        lookup = 'gt'
+    else:
+        order = ('-created', f'-{pk}')
+        lookup = 'lt'
+    if after is not None:
+        created, key = after
+        queryset = queryset.filter(
+            Q(**{f'created__{lookup}': created})
+            | Q(created=created, **{f'{pk}__{lookup}': key})
+        )
+    return queryset.order_by(*order)
+
+
+def paginate(request, posts, per_page):
+    """Страница ленты: ``?page=N`` по номеру, иначе по курсору."""
+    if 'page' in request.GET:
+        paginator = Paginator(posts, per_page)
+        return paginator.get_page(request.GET.get('page'))
+    paginator = CursorPaginator(posts, per_page)
+    return paginator.get_page(request.GET.get('cursor'))
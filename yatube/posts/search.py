@@ -0,0 +1,298 @@
+import re
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import Comment, Post
+
+CURSOR_SALT = 'posts.search'
+MAX_TERMS = 8
+TABLE = 'posts_search'
+COMMENTS_TABLE = 'posts_comment_search'
+POSTS = Post._meta.db_table
+COMMENTS = Comment._meta.db_table
+WORD = re.compile(r'\w+')
+
+
+def search_terms(query):
+    """Слова запроса без операторов FTS: пользователь ищет только слова."""
+    return WORD.findall(query.lower())[:MAX_TERMS]
+
+
+class SQLiteBackend:
+    """Индексы FTS5: документ поста с ``rowid = Post.id`` и отдельный
+    документ каждого комментария с ``rowid = Comment.id``."""
+
+    def _term(self, term):
+        return f'"{term}"*'
+
+    def matching_ids(self, terms):
+        # Каждое слово — в тексте поста или в одном из комментариев.
+        sql = ' INTERSECT '.join(
+            f'SELECT id FROM ('
+            f'SELECT rowid AS id FROM {TABLE} WHERE {TABLE} MATCH %s '
+            f'UNION SELECT post_id FROM {COMMENTS_TABLE} '
+            f'WHERE {COMMENTS_TABLE} MATCH %s) term{i}'
+            for i in range(len(terms))
+        )
+        params = [self._term(t) for t in terms for _ in range(2)]
+        return sql, params
+
+    def ranked(self, terms):
+        # Меньше — лучше; текст поста весит вдвое больше комментария, а
+        # совпадения в нескольких комментариях складываются.
+        sql, params = self.matching_ids(terms)
+        query = ' OR '.join(self._term(t) for t in terms)
+        return (
+            f'SELECT id, SUM(score) AS score FROM ('
+            f'SELECT rowid AS id, 2.0 * bm25({TABLE}) AS score '
+            f'FROM {TABLE} WHERE {TABLE} MATCH %s '
+            f'UNION ALL SELECT post_id, bm25({COMMENTS_TABLE}) '
+            f'FROM {COMMENTS_TABLE} WHERE {COMMENTS_TABLE} MATCH %s'
+            f') ranks WHERE id IN ({sql}) GROUP BY id'
+        ), [query, query, *params]
+
+    def index(self, cursor, placeholders, post_ids):
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})', post_ids
+        )
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {TABLE} (rowid, text) '
+            f'SELECT id, text FROM {POSTS} WHERE id IN ({placeholders})',
+            post_ids,
+        )
+
+    def index_comments(self, cursor, placeholders, comment_ids):
+        cursor.execute(
+            f'DELETE FROM {COMMENTS_TABLE} WHERE rowid IN ({placeholders})',
+            comment_ids,
+        )
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {COMMENTS_TABLE} (rowid, text, post_id) '
+            f'SELECT id, text, post_id FROM {COMMENTS} '
+            f'WHERE id IN ({placeholders})',
+            comment_ids,
+        )
+
+    def drop_post_comments(self, cursor, placeholders, post_ids):
+        # post_id в FTS5 не индексируется: строки ищутся через комментарии.
+        cursor.execute(
+            f'DELETE FROM {COMMENTS_TABLE} WHERE rowid IN ('
+            f'SELECT id FROM {COMMENTS} WHERE post_id IN ({placeholders}))',
+            post_ids,
+        )
+
+    def index_post_comments(self, cursor, placeholders, post_ids):
+        self.drop_post_comments(cursor, placeholders, post_ids)
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {COMMENTS_TABLE} (rowid, text, post_id) '
+            f'SELECT id, text, post_id FROM {COMMENTS} '
+            f'WHERE post_id IN ({placeholders})',
+            post_ids,
+        )
+
+
+class PostgreSQLBackend:
+    """Таблицы ``tsvector`` с GIN-индексами: документ поста с весом A и
+    документ каждого комментария с весом B."""
+
+    def config(self):
+        return settings.SEARCH_CONFIG
+
+    def matching_ids(self, terms):
+        sql = ' INTERSECT '.join(
+            f'SELECT id FROM ('
+            f'SELECT post_id AS id FROM {TABLE} '
+            f'WHERE document @@ to_tsquery(%s::regconfig, %s) '
+            f'UNION SELECT post_id FROM {COMMENTS_TABLE} '
+            f'WHERE document @@ to_tsquery(%s::regconfig, %s)) term{i}'
+            for i in range(len(terms))
+        )
+        params = [
+            value for t in terms for _ in range(2)
+            for value in (self.config(), f'{t}:*')
+        ]
+        return sql, params
+
+    def ranked(self, terms):
+        # Знак меняется, чтобы, как и в bm25, меньше было лучше.
+        sql, params = self.matching_ids(terms)
+        query = ' | '.join(f'{t}:*' for t in terms)
+        return (
+            f'SELECT id, -SUM(rank) AS score FROM ('
+            f'SELECT post_id AS id, ts_rank_cd(document, query) AS rank '
+            f'FROM {TABLE}, to_tsquery(%s::regconfig, %s) query '
+            f'WHERE document @@ query '
+            f'UNION ALL SELECT post_id, ts_rank_cd(document, query) '
+            f'FROM {COMMENTS_TABLE}, to_tsquery(%s::regconfig, %s) query '
+            f'WHERE document @@ query'
+            f') ranks WHERE id IN ({sql}) GROUP BY id'
+        ), [self.config(), query, self.config(), query, *params]
+
+    def index(self, cursor, placeholders, post_ids):
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE post_id IN ({placeholders})', post_ids
+        )
+        cursor.execute(
+            f'INSERT INTO {TABLE} (post_id, document) '
+            f'SELECT id, setweight(to_tsvector(%s::regconfig, '
+            f'COALESCE(text, \'\')), \'A\') '
+            f'FROM {POSTS} WHERE id IN ({placeholders}) '
+            f'ON CONFLICT (post_id) '
+            f'DO UPDATE SET document = EXCLUDED.document',
+            [self.config(), *post_ids],
+        )
+
+    def _insert_comments(self, cursor, column, placeholders, ids):
+        cursor.execute(
+            f'INSERT INTO {COMMENTS_TABLE} (comment_id, post_id, document) '
+            f'SELECT id, post_id, '
+            f'setweight(to_tsvector(%s::regconfig, COALESCE(text, \'\')), '
+            f'\'B\') '
+            f'FROM {COMMENTS} WHERE {column} IN ({placeholders}) '
+            f'ON CONFLICT (comment_id) DO UPDATE SET '
+            f'post_id = EXCLUDED.post_id, document = EXCLUDED.document',
+            [self.config(), *ids],
+        )
+
+    def index_comments(self, cursor, placeholders, comment_ids):
+        cursor.execute(
+            f'DELETE FROM {COMMENTS_TABLE} '
+            f'WHERE comment_id IN ({placeholders})',
+            comment_ids,
+        )
+        self._insert_comments(cursor, 'id', placeholders, comment_ids)
+
+    def drop_post_comments(self, cursor, placeholders, post_ids):
+        cursor.execute(
+            f'DELETE FROM {COMMENTS_TABLE} WHERE post_id IN ({placeholders})',
+            post_ids,
+        )
+
+    def index_post_comments(self, cursor, placeholders, post_ids):
+        self.drop_post_comments(cursor, placeholders, post_ids)
+        self._insert_comments(cursor, 'post_id', placeholders, post_ids)
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgreSQLBackend,
+}
+
+
+def get_backend():
+    """Backend для текущей базы или ``None``, если индекса нет."""
+    backend = BACKENDS.get(connection.vendor)
+    return backend() if backend else None
+
+
+def _apply(method, ids):
+    backend = get_backend()
+    ids = list(ids)
+    if backend is None or not ids:
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    # Удаление и вставка — одна транзакция, а вставка заменяет строку:
+    # две параллельные правки не столкнутся на ключе документа.
+    with transaction.atomic(), connection.cursor() as cursor:
+        getattr(backend, method)(cursor, placeholders, ids)
+
+
+def index_posts(post_ids):
+    """Пересобрать документы постов; удалённые посты пропадают из индекса.
+
+    Комментарии — отдельные документы, их это не касается.
+    """
+    _apply('index', post_ids)
+
+
+def index_comments(comment_ids):
+    """Пересобрать документы комментариев; удалённые пропадают из индекса."""
+    _apply('index_comments', comment_ids)
+
+
+def index_post_comments(post_ids):
+    """Пересобрать документы всех комментариев постов: после
+    ``bulk_create``, который не посылает сигналов."""
+    _apply('index_post_comments', post_ids)
+
+
+def drop_post_comments(post_ids):
+    """Убрать комментарии постов из индекса одним запросом: до
+    каскадного удаления, пока комментарии ещё в базе."""
+    _apply('drop_post_comments', post_ids)
+
+
+def reindex(batch_size=500):
+    """Пересобрать индекс целиком, пачками по ``batch_size`` постов."""
+    ids = Post.objects.order_by('pk').values_list('pk', flat=True)
+    batch = []
+    for pk in ids.iterator():
+        batch.append(pk)
+        if len(batch) == batch_size:
+            index_posts(batch)
+            index_post_comments(batch)
+            batch = []
+    index_posts(batch)
+    index_post_comments(batch)
+
+
+def filter_posts(queryset, query):
+    """Оставить в ``queryset`` посты, найденные по индексу."""
+    terms = search_terms(query)
+    backend = get_backend()
+    if not terms:
+        return queryset.none()
+    if backend is None:
+        return queryset.filter(text__icontains=' '.join(terms))
+    return queryset.filter(pk__in=RawSQL(*backend.matching_ids(terms)))
+
+
+def _load_cursor(cursor):
+    try:
+        score, pk = signing.loads(cursor, salt=CURSOR_SALT)
+        return float(score), int(pk)
+    except (TypeError, ValueError, signing.BadSignature):
+        return None
+
+
+def search_posts(query, cursor=None, per_page=10):
+    """Посты по релевантности и курсор следующей страницы.
+
+    Страницы идут по паре ``(score, id)`` без OFFSET: курсор хранит
+    последнюю пару предыдущей страницы.
+    """
+    terms = search_terms(query)
+    backend = get_backend()
+    if not terms:
+        return [], None
+    if backend is None:
+        posts = list(
+            Post.objects.feed().filter(
+                text__icontains=' '.join(terms)
+            )[:per_page]
+        )
+        return posts, None
+
+    sql, params = backend.ranked(terms)
+    sql = f'SELECT id, score FROM ({sql}) ranked'
+    position = _load_cursor(cursor) if cursor else None
+    if position:
+        sql += ' WHERE score > %s OR (score = %s AND id > %s)'
+        params = [*params, position[0], position[0], position[1]]
+    sql += ' ORDER BY score, id LIMIT %s'
+    params.append(per_page + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = Post.objects.feed().in_bulk([pk for pk, _ in rows])
+    next_cursor = None
+    if has_next:
+        pk, score = rows[-1]
+        next_cursor = signing.dumps([score, pk], salt=CURSOR_SALT)
+    return [posts[pk] for pk, _ in rows if pk in posts], next_cursor
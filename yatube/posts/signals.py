@@ -0,0 +1,112 @@
+from contextvars import ContextVar
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import search, timeline
+from .comments import invalidate_first_page
+from .counters import change_comments_count, change_user_stat
+from .feed_cache import bump_generation, timeline_generation_key
+from .models import Comment, Follow, Group, Post
+
+# Посты, которые сейчас удаляются вместе с комментариями.
+_deleting_posts = ContextVar('deleting_posts', default=frozenset())
+
+
+# Счётчики подключаются раньше лент: prune() смотрит на followers_count.
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        change_user_stat(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_user_stat(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        change_user_stat(instance.user_id, 'following_count', 1)
+        change_user_stat(instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    change_user_stat(instance.user_id, 'following_count', -1)
+    change_user_stat(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments_cache(sender, instance, **kwargs):
+    invalidate_first_page(instance.post_id)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.promote(instance.author)
+        timeline.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user, instance.author)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+def invalidate_feed_cache(sender, **kwargs):
+    bump_generation()
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_timeline(sender, instance, **kwargs):
+    bump_generation(timeline_generation_key(instance.user_id))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_posts([instance.pk])
+
+
+@receiver(pre_delete, sender=Post)
+def unindex_post_comments(sender, instance, **kwargs):
+    # Комментарии поста уходят из индекса одним запросом, а их
+    # каскадное удаление индекс уже не трогает.
+    _deleting_posts.set(_deleting_posts.get() | {instance.pk})
+    search.drop_post_comments([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    _deleting_posts.set(_deleting_posts.get() - {instance.pk})
+    search.index_posts([instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    if instance.post_id not in _deleting_posts.get():
+        search.index_comments([instance.pk])
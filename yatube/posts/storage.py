@@ -0,0 +1,40 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файл под именем из sha256 его содержимого.
+
+    Одинаковые картинки оказываются в одном файле, и sorl создаёт для них
+    одни миниатюры. Если такой файл уже есть, запись пропускается. Файлы
+    общие для нескольких постов, поэтому удалять их вместе с постом
+    нельзя.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        hexdigest = digest.hexdigest()
+        return os.path.join(
+            directory, hexdigest[:2], hexdigest + extension
+        ).replace('\\', '/')
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        # Если тот же файл одновременно пишет другой запрос, родитель
+        # сохранит копию с суффиксом — её потом свернёт dedupe_media.
+        return super()._save(name, content)
+
+    def is_hashed(self, name):
+        return bool(HASHED_NAME.search(name))
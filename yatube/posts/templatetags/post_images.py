@@ -0,0 +1,61 @@
+from django import template
+from django.conf import settings
+from PIL import Image
+
+from posts.thumbnails import (
+    image_formats, prefetch_thumbnails, rendition_key
+)
+
+register = template.Library()
+
+
+def _srcset(thumbnails):
+    return ', '.join(
+        f'{thumbnail.url} {thumbnail.width}w' for thumbnail in thumbnails
+    )
+
+
+def _ready(post, format_=None):
+    """Все размеры варианта по возрастанию ширины или ``None``."""
+    thumbnails = [
+        post.thumbnails.get(rendition_key(geometry, format_))
+        for geometry in settings.POST_THUMBNAIL_SIZES
+    ]
+    if not all(thumbnails):
+        return None
+    return sorted(thumbnails, key=lambda thumbnail: thumbnail.width)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post):
+    """``<picture>`` с вариантами картинки поста в современных форматах.
+
+    Пока варианты не готовы, отдаётся оригинал картинки. Варианты,
+    разложенные ``prefetch_thumbnails`` по постам страницы, берутся без
+    обращения к хранилищу.
+    """
+    if not post.image:
+        return {}
+    if getattr(post, 'thumbnails', None) is None:
+        prefetch_thumbnails([post])
+    fallback = _ready(post)
+    if fallback is None:
+        return {'src': post.image.url}
+
+    sources = []
+    for format_ in image_formats():
+        thumbnails = _ready(post, format_)
+        if thumbnails:
+            sources.append({
+                'type': Image.MIME.get(format_, f'image/{format_.lower()}'),
+                'srcset': _srcset(thumbnails),
+            })
+    largest = fallback[-1]
+    return {
+        'sources': sources,
+        'src': largest.url,
+        'srcset': _srcset(fallback),
+        'sizes': settings.POST_IMAGE_SIZES,
+        'width': largest.width,
+        'height': largest.height,
+    }
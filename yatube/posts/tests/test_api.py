@@ -0,0 +1,77 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+API_INDEX_URL = 'posts:api_index'
+API_POST_DETAIL_URL = 'posts:api_post_detail'
+API_GROUP_LIST_URL = 'posts:api_group_list'
+API_PROFILE_URL = 'posts:api_profile'
+API_FOLLOW_INDEX_URL = 'posts:api_follow_index'
+
+
+class ReadAPITest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        cls.author = User.objects.create_user(username='test-author')
+        cls.group = Group.objects.create(
+            title='test-title', slug='test-slug', description='test'
+        )
+        cls.post = Post.objects.create(
+            text='test-post', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_feeds_return_posts(self):
+        urls = (
+            reverse(API_INDEX_URL),
+            reverse(API_GROUP_LIST_URL, kwargs={'slug': 'test-slug'}),
+            reverse(API_PROFILE_URL, kwargs={'username': 'test-author'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(data['results'][0]['text'], 'test-post')
+                self.assertEqual(data['results'][0]['group'], 'test-slug')
+
+    def test_index_not_modified_until_new_post(self):
+        url = reverse(API_INDEX_URL)
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Post.objects.create(text='new-post', author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_post_detail_changes_with_comments(self):
+        url = reverse(API_POST_DETAIL_URL, kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+
+        Comment.objects.create(post=self.post, author=self.user, text='hi')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['comments_count'], 1)
+
+    def test_follow_feed(self):
+        url = reverse(API_FOLLOW_INDEX_URL)
+        etag = self.client.get(url)['ETag']
+
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['results'][0]['text'], 'test-post')
+
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 401)
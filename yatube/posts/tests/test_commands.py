@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ..counters import reconcile, stats_for
+from ..management.commands.import_posts import Command as ImportCommand
+from ..models import (
+    Comment, Follow, Group, Post, TimelineEntry, User, UserStats,
+)
+
+
+class BenchCommandsTest(TestCase):
+    def test_seed_bench_and_run_bench(self):
+        devnull = open(os.devnull, 'w')
+        self.addCleanup(devnull.close)
+        call_command(
+            'seed_bench', '--users', '30', '--posts', '200',
+            '--comments', '100', '--groups', '3', '--follows', '5',
+            stdout=devnull,
+        )
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertEqual(
+            reconcile(), {
+                'posts_count': 0, 'followers_count': 0,
+                'following_count': 0, 'comments_count': 0,
+            }
+        )
+        reader = UserStats.objects.order_by('-following_count').first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader.user).count(),
+            Post.objects.filter(author__following__user=reader.user).count(),
+        )
+
+        with tempfile.NamedTemporaryFile('r', suffix='.json') as output:
+            call_command(
+                'run_bench', '--repeat', '2', '--warmup', '0',
+                '--depth', '3', '--output', output.name, stdout=devnull,
+            )
+            report = json.load(output)
+        self.assertEqual(set(report['results']), {
+            'index', 'index_deep_cursor', 'index_deep_page', 'profile',
+            'post_detail', 'follow_index',
+        })
+        for result in report['results'].values():
+            self.assertEqual(result['status'], 200)
+            self.assertGreater(result['queries'], 0)
+
+
+class ImportExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост'
+        )
+        Comment.objects.create(
+            author=cls.reader, post=cls.post, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.devnull = open(os.devnull, 'w')
+        self.addCleanup(self.devnull.close)
+
+    def round_trip(self, name):
+        path = os.path.join(self.directory, name)
+        call_command('export_posts', path, stderr=self.devnull)
+        call_command('import_posts', path, stdout=self.devnull)
+        return path
+
+    def test_import_adds_copies_with_shifted_ids(self):
+        for name in ('posts.ndjson', 'posts.csv'):
+            with self.subTest(name=name):
+                before = Post.objects.count()
+                self.round_trip(name)
+                self.assertEqual(Post.objects.count(), before * 2)
+                copy = Post.objects.latest('pk')
+                self.assertEqual(copy.text, self.post.text)
+                self.assertEqual(copy.created, self.post.created)
+                self.assertEqual(copy.group, self.group)
+                self.assertEqual(copy.comments_count, 1)
+                self.assertEqual(copy.comments.get().author, self.reader)
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(stats_for(self.author).posts_count, 4)
+
+    def test_import_resumes_and_skips_done(self):
+        path = self.round_trip('posts.ndjson')
+        with open(f'{path}.state') as state_file:
+            state = json.load(state_file)
+        self.assertTrue(state['done'])
+        call_command('import_posts', path, stdout=self.devnull)
+        self.assertEqual(Post.objects.count(), 2)
+
+        del state['done']
+        state['records'] = 1
+        with open(f'{path}.state', 'w') as state_file:
+            json.dump(state, state_file)
+        call_command('import_posts', path, stdout=self.devnull)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_live_posts_do_not_take_imported_ids(self):
+        path = os.path.join(self.directory, 'posts.ndjson')
+        call_command('export_posts', path, stderr=self.devnull)
+        import_batch = ImportCommand.import_batch
+
+        def import_after_live_post(command, batch):
+            # Пост сайта, созданный после начала загрузки; даты заданы
+            # явно, потому что загрузка отключает auto_now.
+            now = timezone.now()
+            Post.objects.create(
+                author=self.reader, text='Живой пост',
+                created=now, updated=now,
+            )
+            import_batch(command, batch)
+
+        with mock.patch.object(
+            ImportCommand, 'import_batch', import_after_live_post
+        ):
+            call_command('import_posts', path, stdout=self.devnull)
+        live = Post.objects.get(text='Живой пост')
+        copy = Post.objects.exclude(pk=self.post.pk).get(text=self.post.text)
+        self.assertGreater(live.pk, copy.pk)
+        self.assertFalse(live.comments.exists())
+        self.assertEqual(copy.comments.get().author, self.reader)
@@ -0,0 +1,110 @@
+import time
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..feed_cache import GENERATION_KEY
+from ..models import Comment, Group, Post, User
+from .test_urls import (
+    GROUP_LIST_URL,
+    INDEX_URL,
+    POST_DETAIL_URL,
+    PROFILE_URL,
+)
+
+
+class ConditionalPagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        cls.group = Group.objects.create(
+            title='test-title', slug='test-slug', description='test'
+        )
+        cls.post = Post.objects.create(
+            text='test-post', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.urls = (
+            reverse(INDEX_URL),
+            reverse(GROUP_LIST_URL, kwargs={'slug': 'test-slug'}),
+            reverse(PROFILE_URL, kwargs={'username': 'test-user'}),
+            reverse(POST_DETAIL_URL, kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_revalidation_returns_304_without_rendering(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                # Ленты проверяются по кэшу, пост — одним запросом.
+                queries = 1 if url == self.urls[-1] else 0
+                with self.assertNumQueries(queries), \
+                        self.assertTemplateNotUsed('base.html'):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_last_modified_changes_on_delete(self):
+        # Поколение из прошлой секунды: дата в заголовке с точностью до
+        # секунды иначе совпала бы с датой удаления.
+        cache.set(GENERATION_KEY, time.time_ns() - 10 ** 10, None)
+        dates = {
+            url: self.client.get(url)['Last-Modified']
+            for url in self.urls[:-1]
+        }
+        self.assertNotIn(
+            'Last-Modified', self.client.get(self.urls[-1])
+        )
+        Post.objects.create(text='other', author=self.user).delete()
+        for url, date in dates.items():
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=date
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_pages_change_with_posts_and_comments(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        Post.objects.create(
+            text='new-post', author=self.user, group=self.group
+        )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+        url = self.urls[-1]
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.user, text='hi')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etags_survive_cache_flush(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        cache.clear()
+        for url, etag in etags.items():
+            if url == self.urls[-1]:
+                # ETag поста считается по базе и не зависит от кэша.
+                continue
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_cache_headers_depend_on_user(self):
+        url = self.urls[0]
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+        response = self.authorized_client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotEqual(
+            response['ETag'], self.client.get(url)['ETag']
+        )
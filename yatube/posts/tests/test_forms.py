@@ -1,8 +1,13 @@
 
-from django.test import Client, TestCase
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..models import Post, User, Group, Comment
+from ..uploads import count_gif_frames
 from .test_urls import (
     EDIT_POST_URL,
     CREATE_POST_URL,
@@ -122,3 +127,71 @@ class CommentCreateFormTest(TestCase):
             auth_resp = self.authorized_client.post(**self.kwargs)
         self.assertEqual(Comment.objects.count(), Comments_count + 6)
         self.assertEqual(auth_resp.status_code, 200)
+
+
+def make_gif(frames, size=(8, 8)):
+    images = [
+        Image.new('P', size, color=frame) for frame in range(frames)
+    ]
+    content = BytesIO()
+    images[0].save(
+        content, 'GIF', save_all=True, append_images=images[1:]
+    )
+    return content.getvalue()
+
+
+class ImageLimitsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post_image(self, content, name='test.gif'):
+        return self.client.post(reverse(CREATE_POST_URL), {
+            'text': 'test-post-with-img',
+            'image': SimpleUploadedFile(name, content),
+        })
+
+    def test_gif_frames_counted_from_headers(self):
+        for frames in (1, 3, 7):
+            with self.subTest(frames=frames):
+                self.assertEqual(
+                    count_gif_frames(BytesIO(make_gif(frames)), 100), frames
+                )
+        self.assertEqual(count_gif_frames(BytesIO(make_gif(7)), 2), 3)
+
+    @override_settings(POST_IMAGE_MAX_SIZE=1024)
+    def test_large_file_rejected(self):
+        response = self.post_image(make_gif(1, size=(200, 200)) * 20)
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 1,0\xa0КБ.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_SIZE=1024)
+    def test_large_png_rejected_by_size(self):
+        # Обрезанный по лимиту PNG не проходит проверку Pillow: размер
+        # должен проверяться раньше неё.
+        content = BytesIO()
+        Image.effect_noise((100, 100), 64).save(content, 'PNG')
+        response = self.post_image(content.getvalue(), 'test.png')
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 1,0\xa0КБ.'
+        )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_large_resolution_rejected(self):
+        response = self.post_image(make_gif(1, size=(20, 20)))
+        self.assertFormError(
+            response, 'form', 'image', 'Слишком большое разрешение: 20×20.'
+        )
+
+    @override_settings(POST_IMAGE_MAX_FRAMES=2)
+    def test_long_animation_rejected(self):
+        response = self.post_image(make_gif(5))
+        self.assertFormError(
+            response, 'form', 'image', 'В анимации больше 2 кадров.'
+        )
@@ -1,8 +1,26 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
 
-from ..models import Group, Post, User
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..counters import reconcile, stats_for
+from ..models import Comment, Follow, Group, Post, User
 
 LEN_POST_SHORT_DESCRIBE = 15
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
 class PostModelTest(TestCase):
@@ -30,3 +48,121 @@ class PostModelTest(TestCase):
         group = PostModelTest.group
         expected_object_name = self.group.title
         self.assertEqual(expected_object_name, str(group))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+
+    def test_counters_follow_creates_and_deletes(self):
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        comment = Comment.objects.create(
+            author=self.user, post=post, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.user, author=self.author)
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(stats_for(self.author).posts_count, 1)
+        self.assertEqual(stats_for(self.author).followers_count, 1)
+        self.assertEqual(stats_for(self.user).following_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(stats_for(self.author).followers_count, 0)
+        self.assertEqual(stats_for(self.user).following_count, 0)
+
+    def test_post_edit_keeps_comments_count(self):
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        Comment.objects.create(
+            author=self.user, post=post, text='Комментарий'
+        )
+        # Пост прочитан до комментария: в памяти счётчик ещё 0.
+        post.text = 'Исправленный пост'
+        post.save()
+
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Исправленный пост')
+        self.assertEqual(post.comments_count, 1)
+
+    def test_reconcile_fixes_drift(self):
+        Post.objects.bulk_create([
+            Post(author=self.author, text='Тестовый пост') for _ in range(3)
+        ])
+        self.assertEqual(stats_for(self.author).posts_count, 0)
+
+        fixed = reconcile()
+
+        self.assertEqual(fixed['posts_count'], 1)
+        self.assertEqual(stats_for(self.author).posts_count, 3)
+        self.assertEqual(reconcile()['posts_count'], 0)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name):
+        return Post.objects.create(
+            author=self.user,
+            text='Тестовый пост',
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        )
+
+    def test_same_content_stored_once(self):
+        first = self.create_post('first.gif')
+        second = self.create_post('second.GIF')
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.storage.is_hashed(first.image.name))
+        self.assertTrue(first.image.name.endswith('.gif'))
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [
+            os.path.basename(first.image.name)
+        ])
+
+    def test_dedupe_media_merges_legacy_files(self):
+        storage = Post._meta.get_field('image').storage
+        legacy = [
+            storage.path(name) for name in ('posts/a.gif', 'posts/b.gif')
+        ]
+        os.makedirs(storage.path('posts'), exist_ok=True)
+        for path in legacy:
+            with open(path, 'wb') as legacy_file:
+                legacy_file.write(SMALL_GIF)
+        posts = [
+            Post.objects.create(
+                author=self.user, text='Тестовый пост', image=name
+            ) for name in ('posts/a.gif', 'posts/b.gif')
+        ]
+        storage.save('posts/orphan.gif', ContentFile(b'orphan'))
+
+        call_command('dedupe_media', '--delete-orphans', stdout=open(
+            os.devnull, 'w'
+        ))
+
+        names = {
+            Post.objects.get(pk=post.pk).image.name for post in posts
+        }
+        self.assertEqual(len(names), 1)
+        self.assertTrue(storage.exists(names.pop()))
+        files = [
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(storage.path('posts'))
+            for name in names
+        ]
+        self.assertEqual(len(files), 1)
+        self.assertTrue(storage.is_hashed(files[0]))
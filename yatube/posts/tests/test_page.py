@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 
@@ -48,3 +49,54 @@ class PaginatorViewsTest(TestCase):
         )
         # Проверка: количество постов на первой странице равно POSTS_PER_PAGE.
         self.assertEqual(len(response.context['page_obj']), POSTS_PER_PAGE)
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        Post.objects.bulk_create([
+            Post(author=cls.user, text=f'test-post{i}') for i in range(25)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_cover_feed_without_gaps(self):
+        seen = []
+        url = reverse(INDEX_URL)
+        page_obj = self.client.get(url).context['page_obj']
+        seen += [post.id for post in page_obj]
+        while page_obj.has_next():
+            cursor = page_obj.paginator.next_cursor
+            page_obj = self.client.get(
+                url, {'cursor': cursor}
+            ).context['page_obj']
+            seen += [post.id for post in page_obj]
+
+        self.assertEqual(page_obj.number, 3)
+        self.assertEqual(
+            seen,
+            list(Post.objects.order_by('-created', '-id').values_list(
+                'id', flat=True
+            ))
+        )
+
+    def test_previous_cursor_returns_previous_page(self):
+        url = reverse(PROFILE_URL, kwargs={'username': 'test-user'})
+        first = self.client.get(url).context['page_obj']
+        second = self.client.get(
+            url, {'cursor': first.paginator.next_cursor}
+        ).context['page_obj']
+        back = self.client.get(
+            url, {'cursor': second.paginator.previous_cursor}
+        ).context['page_obj']
+
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.client.get(reverse(INDEX_URL), {'cursor': 'broken'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(response.context['page_obj'].paginator.count, 25)
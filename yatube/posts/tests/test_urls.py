@@ -18,9 +18,12 @@ EDIT_POST_URL = 'posts:post_edit'
 POST_DETAIL_URL = 'posts:post_detail'
 
 CREATE_COMMENT_URL = 'posts:add_comment'
+POST_COMMENTS_URL = 'posts:post_comments'
 
 PROFILE_URL = 'posts:profile'
 
+SEARCH_URL = 'posts:search'
+
 
 CREATE_POST_TEMPLATE = 'posts/create_post.html'
 
@@ -60,6 +63,7 @@ class PostURLTests(TestCase):
             'posts/group_list.html': '/group/test/',
             'posts/profile.html': '/profile/HasNoName/',
             'posts/post_detail.html': '/posts/1/',
+            'posts/search.html': '/search/?q=пост',
 
         }
         for template, address in templates_url_names.items():
@@ -1,17 +1,33 @@
+import io
+import json
+import os
 import shutil
 import tempfile
+import zipfile
+from unittest import mock
 
 from django.conf import settings
-from django.test import Client, TestCase, override_settings
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command
 from time import sleep
 
-from ..models import Post, Group, User, Comment, Follow
+from core.models import Task
+from ..models import Post, Group, User, Comment, Follow, TimelineEntry
+from ..comments import COMMENTS_PER_PAGE
+from ..counters import stats_for
+from ..feed_cache import bump_generation, feed_cache_key
 from ..forms import PostForm
+from ..search import reindex, search_posts
+from ..thumbnails import (
+    _lru, generate_thumbnails, prefetch_thumbnails, resolve_renditions
+)
 
 from .test_urls import (
     FOLLOW_INDEX_URL,
@@ -23,6 +39,9 @@ from .test_urls import (
     PROFILE_URL,
     FOLLOW_URL,
     INDEX_URL,
+    SEARCH_URL,
+    POST_COMMENTS_URL,
+    CREATE_COMMENT_URL,
 )
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -280,12 +299,10 @@ class PostCreateImageTests(TestCase):
         ))
 
         self.assertEqual(Post.objects.count(), post_count + 1)
-        self.assertTrue(
-            Post.objects.filter(
-                text='test-image-text',
-                image='posts/small.gif',
-            ).exists()
-        )
+        post = Post.objects.get(text='test-image-text')
+        self.assertTrue(post.image.storage.is_hashed(post.image.name))
+        with post.image.open() as image:
+            self.assertEqual(image.read(), SMALL_GIF)
 
     def test_exist_image_in_context(self):
         pages_names = [
@@ -359,20 +376,38 @@ class CachePageTest(TestCase):
         cache.clear()
         self.authorized_client.get(reverse(INDEX_URL))
 
+        cached_resp = self.authorized_client.get(reverse(INDEX_URL))
+        self.assertIsNone(cached_resp.context)
+
         Post.objects.create(
-            text="test-post-text",
+            text="test-post-new-text",
             author=self.user
         )
 
         new_resp = self.authorized_client.get(reverse(INDEX_URL))
-        context = new_resp.context
-        self.assertIsNone(context)
+        self.assertIsNotNone(new_resp.context)
+        self.assertContains(new_resp, "test-post-new-text")
 
+    def test_stale_page_served_while_rebuilding(self):
         cache.clear()
+        request = RequestFactory().get(reverse(INDEX_URL))
+        request.user = self.user
+        self.authorized_client.get(reverse(INDEX_URL))
+        bump_generation()
+        cache.add(feed_cache_key(request) + ':lock', True)
 
-        new_resp = self.authorized_client.get(reverse(INDEX_URL))
-        context = new_resp.context
-        self.assertIsNotNone(context)
+        stale_resp = self.authorized_client.get(reverse(INDEX_URL))
+        self.assertIsNone(stale_resp.context)
+        # Копия прошлого поколения не получает валидаторы нового.
+        self.assertNotIn('ETag', stale_resp)
+        self.assertNotIn('Last-Modified', stale_resp)
+        self.assertIn('no-store', stale_resp['Cache-Control'])
+        self.assertNotIn('public', stale_resp['Cache-Control'])
+
+        cache.delete(feed_cache_key(request) + ':lock')
+        fresh_resp = self.authorized_client.get(reverse(INDEX_URL))
+        self.assertIsNotNone(fresh_resp.context)
+        self.assertIn('ETag', fresh_resp)
 
 
 class FollowInContextTest(TestCase):
@@ -435,3 +470,422 @@ class FollowInContextTest(TestCase):
             UNFOLLOW_URL, kwargs={'username': 'test-user-author1'}
         ))
         self.assertEqual(Follow.objects.count(), Follows_count - 1)
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user-follower')
+        cls.author = User.objects.create_user(username='test-user-author')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_new_post_fanned_out_to_followers(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='test-post', author=self.author)
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        Post.objects.create(text='test-post', author=self.author)
+        self.authorized_client.get(reverse(
+            FOLLOW_URL, kwargs={'username': self.author.username}
+        ))
+        self.assertEqual(self.user.timeline.count(), 1)
+
+        self.authorized_client.get(reverse(
+            UNFOLLOW_URL, kwargs={'username': self.author.username}
+        ))
+        self.assertEqual(self.user.timeline.count(), 0)
+
+    @mock.patch('posts.timeline.CELEBRITY_FOLLOWERS', 1)
+    def test_celebrity_posts_read_on_request(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(text='test-post', author=self.author)
+
+        self.assertEqual(TimelineEntry.objects.count(), 0)
+        resp = self.authorized_client.get(reverse(FOLLOW_INDEX_URL))
+        self.assertEqual(len(resp.context['page_obj']), 1)
+
+    @mock.patch('posts.timeline.CELEBRITY_FOLLOWERS', 3)
+    @mock.patch('posts.timeline.ORDINARY_FOLLOWERS', 2)
+    def test_demoted_author_materialized_in_background(self):
+        readers = [
+            User.objects.create_user(username=f'test-reader{i}')
+            for i in range(3)
+        ]
+        for reader in readers:
+            Follow.objects.create(user=reader, author=self.author)
+        Post.objects.create(text='test-post', author=self.author)
+        self.assertTrue(stats_for(self.author).celebrity)
+
+        # Между порогами автор остаётся знаменитостью.
+        Follow.objects.get(user=readers[2], author=self.author).delete()
+        self.assertTrue(stats_for(self.author).celebrity)
+        self.assertFalse(Task.objects.exists())
+
+        Follow.objects.get(user=readers[1], author=self.author).delete()
+        self.assertEqual(TimelineEntry.objects.count(), 0)
+        self.assertEqual(
+            Task.objects.get().name, 'posts.timeline.materialize_author'
+        )
+        call_command(
+            'run_worker', '--burst', '--concurrency=0',
+            stdout=io.StringIO(),
+        )
+        self.assertFalse(stats_for(self.author).celebrity)
+        self.assertEqual(readers[0].timeline.count(), 1)
+
+    def test_timeline_pages_merge_fan_out_and_celebrities(self):
+        celebrity = User.objects.create_user(username='test-celebrity')
+        expected = []
+        with mock.patch('posts.timeline.CELEBRITY_FOLLOWERS', 2):
+            Follow.objects.create(user=self.user, author=self.author)
+            Follow.objects.create(user=self.user, author=celebrity)
+            Follow.objects.create(user=self.author, author=celebrity)
+            for number in range(12):
+                author = celebrity if number % 2 else self.author
+                expected.append(
+                    Post.objects.create(text=f'{number}', author=author)
+                )
+            expected.reverse()
+            url = reverse(FOLLOW_INDEX_URL)
+            first = self.authorized_client.get(url).context['page_obj']
+            cursor = first.paginator.next_cursor
+            second = self.authorized_client.get(
+                url, {'cursor': cursor}
+            ).context['page_obj']
+
+        self.assertEqual(TimelineEntry.objects.count(), 6)
+        self.assertEqual(list(first) + list(second), expected)
+        self.assertFalse(second.has_next())
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        cls.post = Post.objects.create(text='test-old-text', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_card_served_from_cache_until_edit(self):
+        url = reverse(PROFILE_URL, kwargs={'username': 'test-user'})
+        self.authorized_client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='test-silent-text')
+        self.assertContains(self.authorized_client.get(url), 'test-old-text')
+
+        self.authorized_client.post(
+            reverse(EDIT_POST_URL, kwargs={'post_id': self.post.pk}),
+            data={'text': 'test-new-text'},
+        )
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'test-new-text')
+        self.assertNotContains(response, 'test-old-text')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPregenerationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        cls.post = Post.objects.create(
+            text='test-post-with-img',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                name='thumb.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def rendition(self, key):
+        image = self.post.image
+        return resolve_renditions([image], [key])[image.name, key]
+
+    def test_original_served_until_thumbnail_ready(self):
+        self.assertIsNone(self.rendition('960x339'))
+        url = reverse(POST_DETAIL_URL, kwargs={'post_id': self.post.pk})
+        self.assertContains(self.client.get(url), self.post.image.url)
+
+        generate_thumbnails(self.post.image.name)
+
+        thumbnail = self.rendition('960x339')
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual(thumbnail.width, 960)
+        self.assertContains(self.client.get(url), thumbnail.url)
+        self.assertGreater(
+            Post.objects.get(pk=self.post.pk).updated, self.post.updated
+        )
+
+    def test_page_thumbnails_resolved_in_one_query(self):
+        generate_thumbnails(self.post.image.name)
+        Post.objects.create(text='test-post-without-img', author=self.user)
+        posts = list(Post.objects.all())
+        _lru.clear()
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            prefetch_thumbnails(posts)
+        with self.assertNumQueries(0):
+            prefetch_thumbnails(posts)
+        post = next(post for post in posts if post.pk == self.post.pk)
+        self.assertEqual(post.thumbnails['480x170'].width, 480)
+        self.assertEqual(post.thumbnails['960x339'].width, 960)
+
+    @override_settings(POST_IMAGE_FORMATS=('PNG',))
+    def test_picture_lists_renditions_in_srcset(self):
+        generate_thumbnails(self.post.image.name)
+        url = reverse(POST_DETAIL_URL, kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+
+        small = self.rendition('480x170.png')
+        large = self.rendition('960x339.png')
+        self.assertContains(
+            response,
+            f'<source type="image/png" srcset="{small.url} 480w, '
+            f'{large.url} 960w"',
+        )
+        self.assertContains(
+            response, self.rendition('480x170').url
+        )
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        cls.title_post = Post.objects.create(
+            text='Синхрофазотрон запущен', author=cls.user
+        )
+        cls.comment_post = Post.objects.create(
+            text='Новости науки', author=cls.user
+        )
+        Comment.objects.create(
+            post=cls.comment_post, author=cls.user,
+            text='А синхрофазотрон уже видели?',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_found_by_prefix_and_ranked_first(self):
+        response = self.client.get(
+            reverse(SEARCH_URL), {'q': 'синхрофаз запущ'}
+        )
+        self.assertEqual(response.context['posts'], [self.title_post])
+
+    def test_index_follows_comments(self):
+        posts, _ = search_posts('видели')
+        self.assertEqual(posts, [self.comment_post])
+
+        comment = Comment.objects.get(post=self.comment_post)
+        comment.text = 'Когда запуск?'
+        comment.save()
+        self.assertEqual(search_posts('видели')[0], [])
+
+        Post.objects.filter(pk=self.comment_post.pk).delete()
+        self.assertEqual(search_posts('запуск')[0], [])
+
+    def test_terms_found_across_post_and_comments(self):
+        posts, _ = search_posts('новости видели')
+        self.assertEqual(posts, [self.comment_post])
+
+    def test_post_without_text_indexed_by_comments(self):
+        post = Post.objects.create(text=None, author=self.user)
+        Comment.objects.create(post=post, author=self.user, text='Пустой')
+        reindex()
+        self.assertEqual(search_posts('пустой')[0], [post])
+
+    def test_comments_indexed_as_own_documents(self):
+        post = Post.objects.create(text='Пост', author=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            Comment.objects.bulk_create(
+                Comment(post=post, author=self.user, text=f'Реплика {i}')
+                for i in range(3)
+            )
+            for comment in post.comments.all():
+                comment.save()
+        # Новый комментарий не пересобирает документ поста.
+        self.assertFalse(any(
+            'posts_search' in query['sql'] for query in queries
+        ))
+        self.assertEqual(search_posts('реплика')[0], [post])
+
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        comment_index = [
+            query for query in queries
+            if 'posts_comment_search' in query['sql']
+        ]
+        self.assertEqual(len(comment_index), 1)
+        self.assertEqual(search_posts('реплика')[0], [])
+
+    def test_pages_by_cursor(self):
+        posts, cursor = search_posts('синхрофазотрон', per_page=1)
+        self.assertEqual(posts, [self.title_post])
+        self.assertIsNotNone(cursor)
+
+        posts, cursor = search_posts('синхрофазотрон', cursor, per_page=1)
+        self.assertEqual(posts, [self.comment_post])
+        self.assertIsNone(cursor)
+
+    def test_reindex_adds_bulk_created_posts(self):
+        Post.objects.bulk_create([
+            Post(text='Фазотрон в подвале', author=self.user)
+        ])
+        self.assertEqual(search_posts('фазотрон')[0], [])
+
+        reindex()
+        self.assertEqual(len(search_posts('фазотрон')[0]), 1)
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        cls.post = Post.objects.create(text='test-post', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'comment-{i}')
+            for i in range(COMMENTS_PER_PAGE + 5)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse(POST_DETAIL_URL, kwargs={'post_id': self.post.pk})
+
+    def test_first_page_cached_until_new_comment(self):
+        response = self.client.get(self.url)
+        self.assertEqual(
+            len(response.context['comments']), COMMENTS_PER_PAGE
+        )
+        Comment.objects.filter(post=self.post).update(text='changed')
+        self.assertNotContains(self.client.get(self.url), 'changed')
+
+        self.client.post(
+            reverse(CREATE_COMMENT_URL, kwargs={'post_id': self.post.pk}),
+            {'text': 'new-comment'},
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['comments'][0].text, 'new-comment')
+        self.assertContains(response, 'changed')
+
+    def test_next_page_by_cursor(self):
+        cursor = self.client.get(self.url).context['next_comments_cursor']
+
+        response = self.client.get(
+            reverse(POST_COMMENTS_URL, kwargs={'post_id': self.post.pk}),
+            {'cursor': cursor},
+        )
+        data = response.json()
+        self.assertEqual(len(data['comments']), 5)
+        self.assertEqual(data['comments'][0]['author'], 'test-user')
+        self.assertIsNone(data['next_cursor'])
+
+        response = self.client.get(self.url, {'cursor': cursor})
+        self.assertEqual(len(response.context['comments']), 5)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    EXPORT_ROOT=os.path.join(TEMP_MEDIA_ROOT, 'exports'),
+)
+class ProfileExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test-user')
+        cls.post = Post.objects.create(
+            text='test-post-with-img',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                name='export.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        Post.objects.create(text='test-second-post', author=cls.user)
+        Post.objects.create(
+            text='test-foreign-post',
+            author=User.objects.create_user(username='test-other'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse(
+            'posts:profile_export', kwargs={'username': self.user.username}
+        )
+
+    def run_worker(self):
+        call_command(
+            'run_worker', '--burst', '--concurrency=0',
+            stdout=open(os.devnull, 'w'),
+        )
+
+    def check_archive(self, content):
+        archive = zipfile.ZipFile(io.BytesIO(content))
+        posts = json.loads(archive.read('posts.json'))
+        self.assertEqual(
+            [post['text'] for post in posts],
+            ['test-post-with-img', 'test-second-post'],
+        )
+        self.assertEqual(
+            archive.read(posts[0]['image']), SMALL_GIF
+        )
+        self.assertIsNone(posts[1]['image'])
+
+    def test_streams_archive(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.check_archive(b''.join(response.streaming_content))
+
+    def test_background_archive(self):
+        response = self.client.get(self.url, {'background': 1})
+        self.assertEqual(response.status_code, 202)
+        self.assertTemplateUsed(response, 'posts/export.html')
+        self.run_worker()
+
+        response = self.client.get(self.url, {'background': 1})
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.check_archive(b''.join(response.streaming_content))
+        response.close()
+
+        Post.objects.create(text='test-new-post', author=self.user)
+        response = self.client.get(self.url, {'background': 1})
+        self.assertEqual(response.status_code, 202)
+        self.run_worker()
+        self.assertEqual(len(os.listdir(settings.EXPORT_ROOT)), 1)
+
+    def test_only_owner(self):
+        other = reverse(
+            'posts:profile_export', kwargs={'username': 'test-other'}
+        )
+        self.assertEqual(self.client.get(other).status_code, 404)
+        self.assertRedirects(
+            Client().get(self.url), f'/auth/login/?next={self.url}'
+        )
@@ -0,0 +1,242 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from core.metrics import count_cache, timed
+from core.tasks import task
+from .feed_cache import bump_generation
+
+try:
+    # Плагин регистрирует в Pillow запись AVIF.
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+PENDING_TIMEOUT = 300
+LRU_SIZE = 2048
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+EXTENSIONS.setdefault('AVIF', 'avif')
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Имя миниатюры sorl без обращения к хранилищу и генерации."""
+
+    def get_thumbnail_name(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
+
+
+backend = ReadyThumbnailBackend()
+
+
+def image_formats():
+    """Форматы из ``POST_IMAGE_FORMATS``, которые Pillow умеет записывать."""
+    Image.init()
+    return [
+        format_ for format_ in settings.POST_IMAGE_FORMATS
+        if format_ in Image.SAVE and format_ in EXTENSIONS
+    ]
+
+
+def rendition_key(geometry, format_=None):
+    if format_ is None:
+        return geometry
+    return f'{geometry}.{EXTENSIONS[format_]}'
+
+
+def renditions():
+    """Все варианты картинки поста: ``{ключ: (размер, опции)}``.
+
+    Вариант в формате sorl по умолчанию называется самим размером,
+    например ``960x339``, вариант в WebP — ``960x339.webp``.
+    """
+    result = {}
+    for geometry, options in settings.POST_THUMBNAIL_SIZES.items():
+        result[rendition_key(geometry)] = (geometry, options)
+        for format_ in image_formats():
+            result[rendition_key(geometry, format_)] = (
+                geometry, {**options, 'format': format_}
+            )
+    return result
+
+
+def _lru_get(name):
+    with _lru_lock:
+        thumbnail = _lru.get(name)
+        if thumbnail is not None:
+            _lru.move_to_end(name)
+        return thumbnail
+
+
+def _lru_put(name, thumbnail):
+    with _lru_lock:
+        _lru[name] = thumbnail
+        _lru.move_to_end(name)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def _lookup_many(names):
+    """Найти миниатюры в KV-хранилище sorl: кэш и база одним запросом."""
+    thumbnails = {name: ImageFile(name, default.storage) for name in names}
+    kvstore = default.kvstore
+    if not hasattr(kvstore, 'cache'):
+        return {
+            name: kvstore.get(thumbnail)
+            for name, thumbnail in thumbnails.items()
+        }
+
+    keys = {
+        add_prefix(thumbnail.key): name
+        for name, thumbnail in thumbnails.items()
+    }
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(
+            KVStore.objects.filter(key__in=missing).values_list('key', 'value')
+        )
+        found = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(
+            found, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(found)
+
+    result = {}
+    for key, name in keys.items():
+        value = values[key]
+        result[name] = (
+            None if value == EMPTY_VALUE else deserialize_image_file(value)
+        )
+    return result
+
+
+def _find(names):
+    """Миниатюры по именам: сначала LRU процесса, затем KV-хранилище."""
+    found = {name: _lru_get(name) for name in names}
+    missing = [name for name, thumbnail in found.items() if thumbnail is None]
+    count_cache('thumbnails', True, len(found) - len(missing))
+    count_cache('thumbnails', False, len(missing))
+    if missing:
+        for name, thumbnail in _lookup_many(missing).items():
+            if thumbnail is not None:
+                _lru_put(name, thumbnail)
+            found[name] = thumbnail
+    return found
+
+
+def resolve_renditions(images, keys, schedule=True):
+    """Варианты ``keys`` для картинок: ``{(имя, вариант): ImageFile | None}``.
+
+    Все имена ищутся одним обращением к KV-хранилищу. Недостающие
+    варианты ставятся в очередь, если не передан ``schedule=False``.
+    """
+    all_renditions = renditions()
+    images = [image for image in images if image]
+    names = {}
+    for key in keys:
+        geometry, options = all_renditions[key]
+        for image in images:
+            names[image.name, key] = backend.get_thumbnail_name(
+                image, geometry, **options
+            )
+    found = _find(set(names.values()))
+
+    result = {pair: found[name] for pair, name in names.items()}
+    if schedule:
+        for image in images:
+            if any(result[image.name, key] is None for key in keys):
+                schedule_thumbnails(image)
+    return result
+
+
+def prefetch_thumbnails(posts):
+    """Разложить по постам страницы ``post.thumbnails = {вариант: ...}``."""
+    posts = list(posts)
+    resolved = resolve_renditions(
+        [post.image for post in posts], list(renditions()), schedule=True
+    )
+    for post in posts:
+        post.thumbnails = {}
+        if post.image:
+            for key in renditions():
+                post.thumbnails[key] = resolved[post.image.name, key]
+
+
+def generate_thumbnails(name, touch_posts=True):
+    """Создать все варианты картинки поста."""
+    from .models import Post
+
+    try:
+        ready = True
+        # Источник берётся через хранилище поля: от него зависит ключ sorl.
+        source = Post(image=name).image
+        with timed('thumbnail'):
+            for geometry, options in renditions().values():
+                thumbnail = get_thumbnail(source, geometry, **options)
+                ready = ready and default.kvstore.get(thumbnail) is not None
+        if not ready:
+            # Пометка «в работе» остаётся до таймаута: битый файл не
+            # будут пытаться обработать на каждом показе страницы.
+            return False
+        if touch_posts:
+            # Карточки с этой картинкой закэшированы с оригиналом вместо
+            # миниатюры: новая версия поста сбрасывает их кэш.
+            Post.objects.filter(image=name).update(updated=timezone.now())
+            bump_generation()
+        cache.delete(pending_key(name))
+        return True
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+        return False
+
+
+def _generate_in_worker(name, touch_posts=True):
+    try:
+        return generate_thumbnails(name, touch_posts)
+    finally:
+        connections.close_all()
+
+
+def pending_key(name):
+    return f'posts:thumbnails:pending:{name}'
+
+
+def schedule_thumbnails(image):
+    """Поставить генерацию миниатюр в очередь фоновых задач."""
+    if not image or not cache.add(pending_key(image.name), True,
+                                  PENDING_TIMEOUT):
+        return
+    thumbnails_task.delay(image.name)
+
+
+@task(max_attempts=3)
+def thumbnails_task(name):
+    generate_thumbnails(name)
@@ -0,0 +1,254 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from core.tasks import task
+from .counters import stats_for
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginators import COUNT_CACHE_TIMEOUT, CursorPaginator, keyset, paginate
+
+# Посты авторов с таким числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении, чтобы один пост не стоил миллиона вставок.
+# Обратно в ленты автор возвращается, только когда подписчиков станет
+# меньше ORDINARY_FOLLOWERS: иначе автор у порога переключался бы с
+# каждой подпиской и отпиской.
+CELEBRITY_FOLLOWERS = 1000
+ORDINARY_FOLLOWERS = 900
+BATCH_SIZE = 500
+MATERIALIZE_TIMEOUT = 3600
+
+
+def is_celebrity(author):
+    return stats_for(author).celebrity
+
+
+def _insert(user_ids, author_id, posts):
+    """Записи лент читателей ``user_ids`` на посты ``posts`` автора."""
+    rows = posts.values_list('id', 'created')
+    for user_id in user_ids:
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id,
+                    author_id=author_id,
+                    post_id=post_id,
+                    created=created,
+                ) for post_id, created in rows.iterator()
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+def fan_out(post):
+    """Разложить новый пост по лентам подписчиков автора."""
+    if is_celebrity(post.author):
+        return
+    followers = Follow.objects.filter(
+        author=post.author
+    ).values_list('user', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                author=post.author,
+                post=post,
+                created=post.created,
+            ) for user_id in followers.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def promote(author):
+    """Сделать автора знаменитостью, если подписчиков набралось."""
+    UserStats.objects.filter(
+        user=author, celebrity=False,
+        followers_count__gte=CELEBRITY_FOLLOWERS,
+    ).update(celebrity=True)
+
+
+def backfill(user, author):
+    """Добавить в ленту читателя уже опубликованные посты автора."""
+    if is_celebrity(author):
+        return
+    _insert([user.pk], author.pk, Post.objects.filter(author=author))
+
+
+def rebuild():
+    """Заполнить ленты заново одним INSERT ... SELECT.
+
+    Нужен после загрузок через ``bulk_create``, которые не посылают
+    сигналов. Счётчики подписчиков должны быть уже сверены: по ним
+    заново ставятся флаги знаменитостей.
+    """
+    UserStats.objects.filter(
+        followers_count__gte=CELEBRITY_FOLLOWERS
+    ).update(celebrity=True)
+    UserStats.objects.filter(
+        followers_count__lt=ORDINARY_FOLLOWERS
+    ).update(celebrity=False)
+    entries = TimelineEntry._meta.db_table
+    follows = Follow._meta.db_table
+    posts = Post._meta.db_table
+    stats = UserStats._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {entries}')
+        cursor.execute(
+            f'INSERT INTO {entries} (user_id, author_id, post_id, created) '
+            f'SELECT f.user_id, p.author_id, p.id, p.created '
+            f'FROM {follows} f '
+            f'JOIN {posts} p ON p.author_id = f.author_id '
+            f'LEFT JOIN {stats} s ON s.user_id = f.author_id '
+            f'WHERE COALESCE(s.celebrity, %s) = %s',
+            [False, False],
+        )
+
+
+def materialize_key(author_id):
+    return f'posts:timeline:materialize:{author_id}'
+
+
+def prune(user, author):
+    """Убрать посты автора из ленты отписавшегося читателя.
+
+    Если подписчиков у знаменитости стало меньше ``ORDINARY_FOLLOWERS``,
+    ленты оставшихся подписчиков дозаполняет фоновая задача: в запросе
+    отписки это стоило бы «подписчики × посты» вставок.
+    """
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+    demotable = UserStats.objects.filter(
+        user=author, celebrity=True, followers_count__lt=ORDINARY_FOLLOWERS,
+    ).exists()
+    if demotable and cache.add(
+        materialize_key(author.pk), True, MATERIALIZE_TIMEOUT
+    ):
+        materialize_author.delay(author.pk)
+
+
+@task(timeout=MATERIALIZE_TIMEOUT)
+def materialize_author(author_id):
+    """Вернуть посты бывшей знаменитости в ленты подписчиков.
+
+    Пока записи вставляются, автор остаётся знаменитостью и его посты
+    подмешиваются при чтении. Посты и подписки, появившиеся за это время,
+    ``fan_out`` и ``backfill`` пропустили: их записи добавляются после
+    снятия флага.
+    """
+    try:
+        started = timezone.now()
+        posts = Post.objects.filter(author_id=author_id)
+        follows = Follow.objects.filter(author_id=author_id)
+        followers = follows.values_list('user', flat=True)
+        _insert(list(followers), author_id, posts)
+        demoted = UserStats.objects.filter(
+            user_id=author_id, celebrity=True,
+            followers_count__lt=ORDINARY_FOLLOWERS,
+        ).update(celebrity=False)
+        if not demoted:
+            return
+        _insert(
+            list(followers), author_id, posts.filter(created__gte=started)
+        )
+        _insert(
+            list(followers.filter(created__gte=started)), author_id, posts
+        )
+    finally:
+        cache.delete(materialize_key(author_id))
+
+
+def celebrities(user):
+    """Подзапрос: «знаменитости» среди авторов, на которых подписан user."""
+    return UserStats.objects.filter(
+        user__in=Follow.objects.filter(user=user).values('author'),
+        celebrity=True,
+    ).values('user')
+
+
+def timeline_posts(user):
+    """Посты ленты подписок одним запросом.
+
+    Нужен для нумерованных страниц и подсчёта; страницы по курсору
+    читает ``TimelinePaginator`` без сортировки всей ленты.
+    """
+    return Post.objects.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=celebrities(user))
+    )
+
+
+class TimelinePaginator(CursorPaginator):
+    """Keyset-страницы ленты подписок из двух выборок.
+
+    Готовые записи ленты идут по индексу (user, -created, -post), посты
+    знаменитостей — по индексу (author, -created, -id), обе с тем же
+    курсором и лимитом. Короткие выборки сливаются в Python.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(timeline_posts(user).feed(), per_page)
+        self.user = user
+
+    @cached_property
+    def count(self):
+        """Приблизительное число постов; пересчитывается раз в минуту."""
+        key = hashlib.md5(f'timeline:{self.user.pk}'.encode()).hexdigest()
+        return cache.get_or_set(
+            'posts:count:' + key, self._count, COUNT_CACHE_TIMEOUT
+        )
+
+    def _count(self):
+        return (
+            TimelineEntry.objects.filter(user=self.user).count()
+            + Post.objects.filter(author__in=celebrities(self.user)).count()
+        )
+
+    def _slice(self, after, backward):
+        limit = self.per_page + 1
+        entries = keyset(
+            TimelineEntry.objects.filter(user=self.user), after, backward,
+            pk='post_id',
+        ).select_related('post__author', 'post__group')[:limit]
+        posts = {entry.post.pk: entry.post for entry in entries}
+        # Пост мог попасть в обе выборки, если автор стал знаменитостью
+        # уже после раскладки.
+        posts.update(
+            (post.pk, post)
+            for post in self._celebrity_posts(after, backward, limit)
+        )
+        return sorted(
+            posts.values(), key=lambda post: (post.created, post.pk),
+            reverse=not backward,
+        )[:limit]
+
+    def _celebrity_posts(self, after, backward, limit):
+        """Не больше ``limit`` постов знаменитостей за курсором.
+
+        Каждый автор читается своим подзапросом с LIMIT по индексу
+        (author, -created, -id): сортируется только ``limit`` постов на
+        автора, а не все их посты.
+        """
+        authors = list(celebrities(self.user).values_list('user', flat=True))
+        if not authors:
+            return []
+        newest = Q()
+        for author in authors:
+            newest |= Q(pk__in=keyset(
+                Post.objects.filter(author=author), after, backward
+            ).values('pk')[:limit])
+        return keyset(
+            Post.objects.feed().filter(newest), after, backward
+        )[:limit]
+
+
+def timeline_page(request, user, per_page):
+    """Страница ленты подписок: по курсору или ``?page=N`` через OFFSET."""
+    if 'page' in request.GET:
+        return paginate(request, timeline_posts(user).feed(), per_page)
+    paginator = TimelinePaginator(user, per_page)
+    return paginator.get_page(request.GET.get('cursor'))
@@ -0,0 +1,127 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+GIF_IMAGE = b'\x2c'
+GIF_EXTENSION = b'\x21'
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл по частям, не больше лимита.
+
+    Остаток слишком большого файла отбрасывается, но его размер
+    досчитывается до конца: форма по ``size`` покажет ошибку. Обработчик
+    должен быть последним в ``FILE_UPLOAD_HANDLERS``.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        allowed = settings.POST_IMAGE_MAX_SIZE - self.received
+        self.received += len(raw_data)
+        if allowed > 0:
+            # Начало файла сохраняется: по нему форма прочитает заголовок.
+            super().receive_data_chunk(raw_data[:allowed], start)
+        return None
+
+
+def _skip_sub_blocks(fp):
+    while True:
+        size = fp.read(1)
+        if not size or size == b'\0':
+            return
+        fp.seek(size[0], 1)
+
+
+def count_gif_frames(fp, limit):
+    """Число кадров GIF по заголовкам блоков, без декодирования.
+
+    Счёт останавливается, как только кадров стало больше ``limit``.
+    """
+    fp.seek(0)
+    header = fp.read(13)
+    if len(header) < 13 or not header.startswith(b'GIF'):
+        return 0
+    flags = header[10]
+    if flags & 0x80:
+        fp.seek(3 << ((flags & 7) + 1), 1)
+    frames = 0
+    while frames <= limit:
+        block = fp.read(1)
+        if block == GIF_IMAGE:
+            frames += 1
+            descriptor = fp.read(9)
+            if len(descriptor) < 9:
+                break
+            if descriptor[8] & 0x80:
+                fp.seek(3 << ((descriptor[8] & 7) + 1), 1)
+            fp.seek(1, 1)
+            _skip_sub_blocks(fp)
+        elif block == GIF_EXTENSION:
+            fp.seek(1, 1)
+            _skip_sub_blocks(fp)
+        else:
+            break
+    return frames
+
+
+def _frames(image, fp):
+    if image.format == 'GIF':
+        return count_gif_frames(fp, settings.POST_IMAGE_MAX_FRAMES)
+    return getattr(image, 'n_frames', 1)
+
+
+def check_upload_size(upload):
+    """Проверить полный размер загрузки.
+
+    Вызывается до проверки картинки Pillow: ``BoundedUploadHandler``
+    обрезает большой файл, и обрезанный PNG или JPEG выглядел бы битым.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s.',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.POST_IMAGE_MAX_SIZE)},
+        )
+
+
+def check_image_limits(upload):
+    """Проверить разрешение и число кадров до полного декодирования.
+
+    Pillow читает из файла только заголовок. Размер и битые файлы к этому
+    моменту уже проверены ``forms.limited_image``.
+    """
+    if hasattr(upload, 'temporary_file_path'):
+        fp = open(upload.temporary_file_path(), 'rb')
+    else:
+        fp = upload
+    try:
+        fp.seek(0)
+        try:
+            image = Image.open(fp)
+            width, height = image.size
+            frames = _frames(image, fp)
+        except Exception:
+            return
+    finally:
+        if fp is upload:
+            fp.seek(0)
+        else:
+            fp.close()
+
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большое разрешение: %(width)s×%(height)s.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+    if frames > settings.POST_IMAGE_MAX_FRAMES:
+        raise ValidationError(
+            'В анимации больше %(limit)s кадров.',
+            code='too_many_frames',
+            params={'limit': settings.POST_IMAGE_MAX_FRAMES},
+        )
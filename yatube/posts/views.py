@@ -1,22 +1,35 @@
-from django.core.paginator import Paginator
+from django.conf import settings
+from django.http import (
+    FileResponse, Http404, JsonResponse, StreamingHttpResponse,
+)
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.decorators.cache import cache_page
 from django.contrib.auth.decorators import login_required
-from .models import Post, Group, User, Comment, Follow
+from core.decorators import query_budget, single_writer
+from .models import Post, Group, User, Follow
 from .forms import PostForm, CommentForm
+from .comments import comments_page, first_comments_page
+from .conditional import (
+    conditional_page, page_etag, page_last_modified, post_page_etag,
+)
+from .counters import stats_for
+from .exports import export_chunks, ready_export, schedule_export
+from .feed_cache import feed_cache
+from .paginators import paginate
+from .search import search_posts
+from .thumbnails import prefetch_thumbnails, schedule_thumbnails
+from .timeline import timeline_page
 
 
 POSTS_PER_PAGE = 10
 LEN_SHORT_POST = 30
 
 
-@cache_page(20)
+@conditional_page(page_etag, page_last_modified)
+@feed_cache
+@query_budget(4)
 def index(request):
-    paginator = Paginator(Post.objects.all(), POSTS_PER_PAGE)
-
-    page_number = request.GET.get('page')
-
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, Post.objects.feed(), POSTS_PER_PAGE)
+    prefetch_thumbnails(page_obj)
 
     context = {
         'page_obj': page_obj,
@@ -24,15 +37,14 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(page_etag, page_last_modified)
+@query_budget(5)
 def group_list(request, slug):
     group = get_object_or_404(Group, slug=slug)
 
-    posts = group.posts.all()
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-
-    page_number = request.GET.get('page')
-
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.feed()
+    page_obj = paginate(request, posts, POSTS_PER_PAGE)
+    prefetch_thumbnails(page_obj)
 
     context = {
         'group': group,
@@ -41,6 +53,8 @@ def group_list(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(page_etag, page_last_modified)
+@query_budget(7)
 def profile(request, username):
     user = get_object_or_404(User, username=username)
     user_auth = request.user.is_authenticated
@@ -51,15 +65,13 @@ def profile(request, username):
 
     see_self_profile = user_auth and username == request.user.username
 
-    posts = user.posts.all()
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = user.posts.feed()
+    page_obj = paginate(request, posts, POSTS_PER_PAGE)
+    prefetch_thumbnails(page_obj)
 
     context = {
         'page_obj': page_obj,
-        'posts_count': posts.count(),
+        'posts_count': stats_for(user).posts_count,
         'author': user,
         'following': following,
         'see_self_profile': see_self_profile,
@@ -67,17 +79,21 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page(post_page_etag)
+@query_budget(5)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = Comment.objects.filter(post=post)
-    author = post.author
-
-    posts_count = Post.objects.filter(author=author).count()
+    post = get_object_or_404(Post.objects.feed(), id=post_id)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        comments, next_cursor = comments_page(post, cursor)
+    else:
+        comments, next_cursor = first_comments_page(post)
     context = {
         'post': post,
-        "posts_count": posts_count,
+        "posts_count": stats_for(post.author).posts_count,
         'short_post': post.text[:LEN_SHORT_POST],
         'comments': comments,
+        'next_comments_cursor': next_cursor,
         'form': CommentForm()
     }
 
@@ -85,6 +101,7 @@ def post_detail(request, post_id):
 
 
 @login_required
+@single_writer()
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -96,7 +113,9 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            schedule_thumbnails(post.image)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -107,6 +126,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@single_writer()
 def post_create(request):
     user = request.user
     form = PostForm(
@@ -118,6 +138,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = user
         post.save()
+        schedule_thumbnails(post.image)
 
         return redirect('posts:profile', user.username)
 
@@ -129,6 +150,7 @@ def post_create(request):
 
 
 @login_required
+@single_writer()
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
     post = Post.objects.get(pk=post_id)
@@ -143,11 +165,10 @@ def add_comment(request, post_id):
 
 
 @login_required
+@query_budget(4)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = timeline_page(request, request.user, POSTS_PER_PAGE)
+    prefetch_thumbnails(page_obj)
 
     context = {
         'page_obj': page_obj,
@@ -156,6 +177,38 @@ def follow_index(request):
 
 
 @login_required
+def profile_export(request, username):
+    """Архив постов владельца аккаунта.
+
+    Небольшой архив собирается прямо в ответ. Большие аккаунты и запрос
+    с ``?background`` получают архив, собранный в фоне: пока его нет,
+    отдаётся страница ожидания.
+    """
+    if request.user.username != username:
+        raise Http404
+    user = request.user
+    filename = f'{username}-posts.zip'
+    background = (
+        'background' in request.GET
+        or stats_for(user).posts_count > settings.EXPORT_STREAM_MAX_POSTS
+    )
+    if not background:
+        response = StreamingHttpResponse(
+            export_chunks(user), content_type='application/zip'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    path = ready_export(user)
+    if path:
+        return FileResponse(
+            open(path, 'rb'), as_attachment=True, filename=filename
+        )
+    schedule_export(user)
+    return render(request, 'posts/export.html', {'author': user}, status=202)
+
+
+@login_required
+@single_writer(methods=('GET', 'POST'))
 def profile_follow(request, username):
     if (request.user.username != username):
         Follow.objects.get_or_create(
@@ -166,6 +219,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@single_writer(methods=('GET', 'POST'))
 def profile_unfollow(request, username):
     follow = Follow.objects.filter(
         user=request.user,
@@ -175,3 +229,38 @@ def profile_unfollow(request, username):
     follow.delete()
 
     return redirect('posts:profile', username=username)
+
+
+@query_budget(4)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = search_posts(
+        query, request.GET.get('cursor'), POSTS_PER_PAGE
+    )
+    prefetch_thumbnails(posts)
+
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(2)
+def post_comments(request, post_id):
+    """Следующие страницы комментариев в JSON для «Показать ещё»."""
+    post = get_object_or_404(Post, pk=post_id)
+    comments, next_cursor = comments_page(post, request.GET.get('cursor'))
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.pk,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created.isoformat(),
+            }
+            for comment in comments
+        ],
+        'next_cursor': next_cursor,
+    })
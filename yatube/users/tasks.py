@@ -0,0 +1,11 @@
+from django.core.mail import EmailMultiAlternatives
+
+from core.tasks import task
+
+
+@task
+def send_email(subject, body, from_email, recipients, html=None):
+    message = EmailMultiAlternatives(subject, body, from_email, recipients)
+    if html:
+        message.attach_alternative(html, 'text/html')
+    message.send()
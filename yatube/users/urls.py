@@ -2,6 +2,7 @@ from django.contrib.auth.views import LoginView, LogoutView, PasswordResetView
 from django.urls import path
 
 from . import views
+from .forms import PasswordResetForm
 
 app_name = 'users'
 
@@ -9,7 +10,7 @@ urlpatterns = [
     path('signup/', views.SignUp.as_view(), name='signup'),
     path(
         'password_reset_form/',
-        PasswordResetView.as_view(),
+        PasswordResetView.as_view(form_class=PasswordResetForm),
         name='password_reset_form'
     ),
     path(
@@ -1,4 +1,6 @@
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -14,6 +16,43 @@ SECRET_KEY = '6*g0=6igf_l-uhl)ks1s*5)_d9*4y$95*3463ia0pu-fa39^t$'
 DEBUG = True
 
 
+# perf: доля замеряемых запросов и заголовок Server-Timing. Prometheus
+# читает /metrics/ с заголовком «Authorization: Bearer <токен>»; адреса
+# из PERF_METRICS_IPS пускаются без токена — за прокси REMOTE_ADDR
+# у всех запросов один, поэтому по умолчанию список пуст
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', 1 if DEBUG else 0.1))
+PERF_SERVER_TIMING = DEBUG
+PERF_METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+PERF_METRICS_IPS = ()
+# порог журнала медленных запросов, мс; None выключает журнал
+SLOW_QUERY_MS = 100
+
+# search: конфигурация полнотекстового поиска PostgreSQL
+SEARCH_CONFIG = 'russian'
+
+# uploads: файл пишется во временный файл по частям, а лимиты картинки
+# проверяются по заголовку до полного декодирования
+FILE_UPLOAD_HANDLERS = ['posts.uploads.BoundedUploadHandler']
+POST_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 25_000_000
+POST_IMAGE_MAX_FRAMES = 100
+
+# exports: архив постов для владельца аккаунта. Аккаунты больше
+# EXPORT_STREAM_MAX_POSTS постов собираются в фоне в EXPORT_ROOT, который
+# не раздаётся как media
+EXPORT_ROOT = os.path.join(BASE_DIR, 'exports')
+EXPORT_STREAM_MAX_POSTS = 1000
+
+# tasks: очередь фоновых задач в таблице core_task, её выполняет
+# manage.py run_worker. TASKS_EAGER выполняет задачи сразу после коммита
+TASKS_EAGER = False
+TASK_WORKERS = 4
+TASK_POLL_INTERVAL = 1
+TASK_VISIBILITY_TIMEOUT = 300
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 10
+TASK_MAX_RETRY_DELAY = 3600
+
 # media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -44,6 +83,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
+    'core.middleware.SlowQueryMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,7 +102,7 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,13 +123,42 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# WAL пускает чтение параллельно с записью, synchronous=NORMAL в WAL
+# теряет при сбое питания только последние транзакции, а не целостность.
+# Транзакции начинаются с BEGIN IMMEDIATE, соединения живут CONN_MAX_AGE.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 5000,
+                'cache_size': -64000,
+                'mmap_size': 256 * 1024 * 1024,
+            },
+        },
     }
 }
 
+# Реплики для чтения: пути к копиям базы через запятую в DB_REPLICAS.
+# Для SQLite копии обновляет manage.py sync_replica.
+REPLICA_FILES = [name for name in os.getenv('DB_REPLICAS', '').split(',') if name]
+for index, name in enumerate(REPLICA_FILES):
+    DATABASES[f'replica{index + 1}'] = {
+        **DATABASES['default'],
+        'NAME': name,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# после записи браузер столько секунд читает основную базу
+REPLICA_STICKY_SECONDS = 5
+REPLICA_STICKY_COOKIE = 'primary_reads'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -107,11 +178,46 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
-CACHES = {
-    'default': {
+# Общий для всех воркеров кэш: Redis в проде, файловый кэш во временной
+# папке локально. Тесты (manage.py test и pytest) получают кэш в памяти
+# своего процесса, чтобы не делить файлы с dev-сервером и другими прогонами.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+REDIS_URL = os.getenv('REDIS_URL')
+if TESTING:
+    SHARED_CACHE = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'yatube-tests',
+    }
+elif REDIS_URL:
+    SHARED_CACHE = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv(
+            'CACHE_DIR', os.path.join(tempfile.gettempdir(), 'yatube_cache')
+        ),
+    }
+
+# CACHE_TWO_TIER=1 ставит перед общим кэшем локальный LRU воркера.
+if os.getenv('CACHE_TWO_TIER'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TwoTierCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'L1_MAX_ENTRIES': 1000,
+                'L1_TIMEOUT': 2,
+            },
+        },
+        'shared': SHARED_CACHE,
+    }
+else:
+    CACHES = {
+        'default': SHARED_CACHE,
     }
-}
 
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
@@ -145,6 +251,19 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# thumbnails: размеры, которые готовятся в фоне сразу после загрузки
+POST_THUMBNAIL_SIZES = {
+    '480x170': {'crop': 'center', 'upscale': True},
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+# Каждый размер дополнительно сохраняется в этих форматах, если Pillow
+# умеет их записывать (AVIF — с установленным pillow-avif-plugin).
+POST_IMAGE_FORMATS = ('AVIF', 'WEBP')
+# атрибут sizes у <img> и <source>
+POST_IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+# число потоков по умолчанию для manage.py warm_thumbnails --workers
+THUMBNAIL_WORKERS = 2
+
 # media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -5,6 +5,8 @@ from django.conf.urls import handler404, handler403, handler500
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import metrics
+
 
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
@@ -18,6 +20,8 @@ urlpatterns = [
 
     path('about/', include('about.urls', namespace='about')),
 
+    path('metrics/', metrics, name='metrics'),
+
     path('', include('posts.urls', namespace="posts")),
 ]
 